@@ -5,6 +5,8 @@ SERIAL_CONFIG = {
     'port': '/dev/ttyACM0',  # Puerto serial (cambiar según el sistema)
     'baud_rate': 115200,     # Velocidad de comunicación
     'timeout': 1,            # Timeout en segundos
+    'write_timeout': 1,      # s máximos bloqueado escribiendo un comando
+    'log_traffic': False,    # Imprimir cada comando y respuesta (depuración; cada print bloquea en stdout)
     'encoding': 'utf-8'      # Codificación de caracteres
 }
 
@@ -13,12 +15,16 @@ CAMERA_CONFIG = {
     'camera_x': {
         'index': 2,          # Índice de la cámara para el eje X
         'resolution': (1580, 1020),
-        'fps': 30
+        'fps': 30,
+        'fourcc': 'MJPG',    # Formato de captura (MJPG evita el límite de ancho de banda de YUYV)
+        'buffer_size': 1     # Frames en el buffer del driver
     },
     'camera_y': {
         'index': 0,          # Índice de la cámara para el eje Y
         'resolution': (1580, 1020),
-        'fps': 30
+        'fps': 30,
+        'fourcc': 'MJPG',    # Formato de captura (MJPG evita el límite de ancho de banda de YUYV)
+        'buffer_size': 1     # Frames en el buffer del driver
     }
 }
 
@@ -26,7 +32,15 @@ CAMERA_CONFIG = {
 DETECTION_CONFIG = {
     'min_area': 50,         # Área mínima para detectar objetos
     'confidence_threshold': 0.7,  # Umbral de confianza
-    'max_objects': 10        # Máximo número de objetos a detectar
+    'max_objects': 10,       # Máximo número de objetos a detectar
+    'processing_scale': 0.5, # Escala del frame usado para HSV/máscaras (1.0 = resolución completa)
+    'mask_workers': 4,       # Threads para procesar las máscaras de color en paralelo
+    'use_opencl': True,      # Usar OpenCL (UMat) para HSV y etiquetado si está disponible
+    'use_cuda': True,        # Usar cv2.cuda para HSV y etiquetado si hay una GPU NVIDIA (tiene prioridad)
+    'shape_cache_ttl': 30,   # Frames durante los que se reutiliza la forma de un contorno sin cambios
+    'shape_cache_size': 1024, # Entradas máximas de la caché de formas por cámara
+    'max_contours': 10,      # Contornos más grandes que se analizan por color en cada frame
+    'preview_interval': 0.033  # s máximos entre frames decodificados aunque la detección no pida uno
 }
 
 # Configuración de colores HSV
@@ -39,7 +53,8 @@ COLOR_RANGES = {
     "red2": {
         "lower": [170, 100, 100],
         "upper": [180, 255, 255],
-        "bgr": (0, 0, 255)
+        "bgr": (0, 0, 255),
+        "alias": "red"       # Segundo tramo del rojo (el tono da la vuelta en 180)
     },
     "yellow": {
         "lower": [20, 100, 100],
@@ -77,7 +92,15 @@ ROBOT_CONFIG = {
         'x_min': -200, 'x_max': 200,
         'y_min': -200, 'y_max': 200,
         'z_min': 0, 'z_max': 100
-    }
+    },
+    # Constantes del firmware para estimar la duración de una trayectoria
+    'steps_per_mm': 320,              # 200 pasos × 16 micropasos / 10 mm por vuelta
+    'motor_speed_range': (100, 1000), # Pasos/s que el firmware asigna a las velocidades 0 y 100
+    'motor_accel_range': (100, 500),  # Pasos/s² para las aceleraciones 0 y 100 (500 hasta recibir A:)
+    'gripper_settle_ms': 500,         # Espera tras cada paso de pinza de W (GRIPPER_SETTLE_MS del firmware)
+    'motion_timeout_margin': 1.5,     # Factor sobre la duración estimada al esperar el OK de W
+    'motion_timeout_extra': 5.0,      # s añadidos a ese timeout (comunicación y pinza)
+    'trajectory_chunk': 2             # Puntos por comando W en move_through (se puede cancelar entre bloques)
 }
 
 # Comandos del controlador ESP32
@@ -92,6 +115,7 @@ ESP32_COMMANDS = {
     'HOME': 'H',             # Ir a posición home
     'PICK': 'P',             # Posición de recogida
     'PLACE': 'L',            # Posición de colocación
+    'TRAJECTORY': 'W',       # Trayectoria de varios puntos
     
     # Control de velocidad
     'SET_SPEED': 'S',        # Establecer velocidad
@@ -112,5 +136,17 @@ GUI_CONFIG = {
     'window_size': '1200x800',
     'theme': 'clam',
     'button_size': (150, 50),
-    'update_rate': 100       # ms entre actualizaciones
+    'update_rate': 100,      # ms entre actualizaciones
+    'camera_update_rate': 33,  # ms entre refrescos de las vistas de cámara activas
+    'camera_probe_ttl': 5.0,   # s durante los que se reutiliza la última prueba de cámaras
+    'preview_size': (520, 440),  # Tamaño máximo (ancho, alto) de las vistas de cámara
+    'max_update_interval': 500,  # ms máximos entre actualizaciones cuando no hay cambios
+    'position_poll_interval': 0.2,  # s entre consultas de posición al ESP32
+    'jog_repeat_ms': 250,    # ms entre pasos mientras se mantiene un botón de movimiento
+    'jog_max_hz': 20,        # Máximo de comandos de movimiento relativo por segundo
+    'log_flush_ms': 100,     # ms entre refrescos del log de rutinas
+    'log_queue_size': 500,   # Líneas pendientes máximas antes de descartar las más antiguas
+    'log_max_lines': 2000,   # Líneas conservadas en el log de rutinas
+    'shutdown_timeout': 2.0, # s máximos esperando a que termine la rutina al cerrar
+    'position_join_timeout': 3.0  # s esperando al thread de posición (más que los 2 s de get_status)
 }
@@ -37,6 +37,9 @@
 #define MAX_SPEED 1000
 #define ACCELERATION 500
 
+// Tiempo que se da al servo de la pinza para llegar a su posición en una trayectoria (ms)
+#define GRIPPER_SETTLE_MS 500
+
 // Variables globales
 AccelStepper stepperX(AccelStepper::DRIVER, STEP_PIN_X, DIR_PIN_X);
 AccelStepper stepperY(AccelStepper::DRIVER, STEP_PIN_Y, DIR_PIN_Y);
@@ -52,12 +55,14 @@ struct RobotState {
   int speed = 50;
   int acceleration = 50;
   bool is_moving = false;
+  bool motion_pending = false;  // Hay un movimiento por confirmar con DONE
   bool emergency_stop = false;
 } robot_state;
 
 // Variables de control
 String inputString = "";
 bool stringComplete = false;
+String motionInput = "";  // Línea recibida mientras se ejecuta una trayectoria
 unsigned long lastStatusTime = 0;
 const unsigned long STATUS_INTERVAL = 1000; // 1 segundo
 
@@ -101,6 +106,7 @@ void setup() {
   Serial.println("K:x,y - Auto pick");
   Serial.println("C:x,y - Auto place");
   Serial.println("V:object_id - Vision pick");
+  Serial.println("W:x,y,z,speed;Gposition;... - Trayectoria (durante ella solo se atienden E y T)");
 }
 
 void loop() {
@@ -114,6 +120,12 @@ void loop() {
   // Ejecutar movimientos de motores
   runSteppers();
   
+  // Avisar cuando el movimiento solicitado ha terminado
+  if (robot_state.motion_pending && !robot_state.is_moving) {
+    robot_state.motion_pending = false;
+    Serial.println("DONE");
+  }
+  
   // Enviar estado periódicamente
   if (millis() - lastStatusTime > STATUS_INTERVAL) {
     sendStatus();
@@ -216,6 +228,10 @@ void processCommand(String command) {
       visionPick(params);
       break;
       
+    case 'W': // Trayectoria de varios puntos
+      executeTrajectory(params);
+      break;
+      
     default:
       Serial.println("Comando no reconocido: " + command);
       break;
@@ -223,6 +239,12 @@ void processCommand(String command) {
 }
 
 void moveToPosition(String params) {
+  if (setTargetPosition(params)) {
+    Serial.println("OK");
+  }
+}
+
+bool setTargetPosition(String params) {
   // Formato: "x,y,z,speed"
   int comma1 = params.indexOf(',');
   int comma2 = params.indexOf(',', comma1 + 1);
@@ -230,7 +252,7 @@ void moveToPosition(String params) {
   
   if (comma1 == -1 || comma2 == -1 || comma3 == -1) {
     Serial.println("Error: Formato inválido para movimiento");
-    return;
+    return false;
   }
   
   float x = params.substring(0, comma1).toFloat();
@@ -241,7 +263,7 @@ void moveToPosition(String params) {
   // Validar límites
   if (x < -200 || x > 200 || y < -200 || y > 200 || z < 0 || z > 100) {
     Serial.println("Error: Posición fuera de límites");
-    return;
+    return false;
   }
   
   // Calcular pasos
@@ -265,14 +287,89 @@ void moveToPosition(String params) {
   robot_state.y = y;
   robot_state.z = z;
   robot_state.speed = speed;
+  robot_state.motion_pending = true;
+  
+  return true;
+}
+
+void executeTrajectory(String params) {
+  // Formato: "x,y,z,speed;x,y,z,speed;Gposition;..."
+  // Cada punto se completa antes de pasar al siguiente y se responde un solo OK al final
+  int start = 0;
+  while (start < (int)params.length()) {
+    int end = params.indexOf(';', start);
+    if (end == -1) end = params.length();
+    String segment = params.substring(start, end);
+    start = end + 1;
+    
+    if (segment.charAt(0) == 'G') {
+      setGripper(segment.substring(1).toInt());
+      waitForGripper();
+    } else if (setTargetPosition(segment)) {
+      waitForMotion();
+    } else {
+      return;
+    }
+    
+    if (robot_state.emergency_stop) {
+      return;
+    }
+  }
   
+  // El OK ya confirma el final del recorrido: no se envía además DONE
+  robot_state.motion_pending = false;
   Serial.println("OK");
 }
 
+void waitForMotion() {
+  // Ejecutar los motores hasta llegar al destino sin dejar de leer el puerto serial
+  do {
+    runSteppers();
+    checkLimitSwitches();
+    readSerialDuringMotion();
+  } while (robot_state.is_moving && !robot_state.emergency_stop);
+}
+
+void waitForGripper() {
+  // El servo no informa cuándo llega: esperar un tiempo fijo sin dejar de leer el puerto
+  unsigned long start = millis();
+  while (millis() - start < GRIPPER_SETTLE_MS && !robot_state.emergency_stop) {
+    checkLimitSwitches();
+    readSerialDuringMotion();
+  }
+}
+
+void readSerialDuringMotion() {
+  // inputString aún contiene la trayectoria en curso: las líneas nuevas van a motionInput.
+  // Se atienden la parada de emergencia y el estado; el resto se rechaza con BUSY
+  // para que no quede pendiente hasta el final del recorrido
+  while (Serial.available()) {
+    char inChar = (char)Serial.read();
+    if (inChar != '\n') {
+      motionInput += inChar;
+      continue;
+    }
+    
+    motionInput.trim();
+    if (motionInput.length() > 0) {
+      char cmd = motionInput.charAt(0);
+      if (cmd == 'E') {
+        emergencyStop();
+      } else if (cmd == 'T') {
+        sendStatus();
+      } else {
+        Serial.println("BUSY");
+      }
+    }
+    motionInput = "";
+  }
+}
+
 void moveY(float distance) {
   long steps = mmToSteps(distance);
   stepperY.move(steps);
   robot_state.y += distance;
+  robot_state.motion_pending = true;
   Serial.println("OK");
 }
 
@@ -280,14 +377,19 @@ void moveZ(float distance) {
   long steps = mmToSteps(distance);
   stepperZ.move(steps);
   robot_state.z += distance;
+  robot_state.motion_pending = true;
   Serial.println("OK");
 }
 
 void controlGripper(int position) {
+  setGripper(position);
+  Serial.println("OK");
+}
+
+void setGripper(int position) {
   position = constrain(position, 0, 180);
   gripperServo.write(position);
   robot_state.grip = position;
-  Serial.println("OK");
 }
 
 void goHome() {
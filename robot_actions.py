@@ -1,13 +1,54 @@
-import time
+import threading
+import numpy as np
 from typing import Optional, Tuple
 from serial_communication import SerialConnection
 from config import ROBOT_CONFIG
 
+# Límites del workspace como arrays [X, Y, Z] (se construyen una sola vez)
+_LIMITS = ROBOT_CONFIG['workspace_limits']
+_LIMITS_LO = np.array([_LIMITS['x_min'], _LIMITS['y_min'], _LIMITS['z_min']], dtype=float)
+_LIMITS_HI = np.array([_LIMITS['x_max'], _LIMITS['y_max'], _LIMITS['z_max']], dtype=float)
+
+def _map_range(value: float, value_range: Tuple[float, float]) -> float:
+    """Equivalente a map(value, 0, 100, low, high) del firmware."""
+    low, high = value_range
+    return low + (high - low) * max(0, min(100, value)) / 100
+
+def _trajectory_duration(start, steps, speed: int, acceleration: float) -> float:
+    """Estima los segundos que el ESP32 tarda en recorrer una trayectoria desde start.
+    
+    AccelStepper mueve cada eje por separado con rampa de aceleración, así que cada
+    segmento dura lo que tarde su eje con más pasos. Cada paso de pinza suma la espera
+    fija del firmware.
+    """
+    points = [start] + [step for step in steps if not isinstance(step, int)]
+    grip_time = (len(steps) - (len(points) - 1)) * ROBOT_CONFIG['gripper_settle_ms'] / 1000
+    if len(points) < 2:
+        return grip_time
+    
+    max_speed = _map_range(speed, ROBOT_CONFIG['motor_speed_range'])
+    distances = np.abs(np.diff(np.asarray(points, dtype=float), axis=0)) * ROBOT_CONFIG['steps_per_mm']
+    # Perfil trapezoidal si el eje llega a la velocidad máxima, triangular si no
+    ramp = max_speed * max_speed / acceleration
+    times = np.where(distances >= ramp,
+                     distances / max_speed + max_speed / acceleration,
+                     2 * np.sqrt(distances / acceleration))
+    return float(times.max(axis=1).sum()) + grip_time
+
 class RobotActions:
     def __init__(self, serial_connection: SerialConnection):
         self.serial_connection = serial_connection
         self.current_position = {'x': 0, 'y': 0, 'z': 0, 'grip': 0}
-        self.is_moving = False
+        self.position_synced = False  # Se vuelve a consultar al ESP32 cuando es False
+        # Evento compartido con la conexión serial: activo mientras no hay movimiento en curso
+        self._done_event = serial_connection.motion_done
+        # Aceleración de los motores en pasos/s² (la del firmware al arrancar)
+        self.motor_acceleration = ROBOT_CONFIG['motor_accel_range'][1]
+
+    @property
+    def is_moving(self) -> bool:
+        """Indica si hay un movimiento pendiente de confirmación (DONE) por el ESP32."""
+        return not self._done_event.is_set()
 
     def update_position(self, x: float, y: float, z: float, grip: int = 0):
         """Actualiza la posición actual del brazo."""
@@ -18,26 +59,77 @@ class RobotActions:
         status = self.serial_connection.get_status()
         if status:
             self.update_position(status['x'], status['y'], status['z'], status['grip'])
+            self.position_synced = True
         return self.current_position
 
+    def sync_position(self) -> dict:
+        """Sincroniza la posición conocida con la reportada por el ESP32."""
+        return self.get_current_position()
+
     def move_to_position(self, x: float, y: float, z: float, speed: int = 50) -> bool:
         """Mueve el brazo a una posición específica."""
         # Validar límites del workspace
-        limits = ROBOT_CONFIG['workspace_limits']
-        x = max(limits['x_min'], min(limits['x_max'], x))
-        y = max(limits['y_min'], min(limits['y_max'], y))
-        z = max(limits['z_min'], min(limits['z_max'], z))
+        x, y, z = np.clip((x, y, z), _LIMITS_LO, _LIMITS_HI).tolist()
         
-        self.is_moving = True
+        # send_command desactiva el evento bajo el lock de comandos, antes de escribir
         success = self.serial_connection.move_to_position(x, y, z, speed)
         if success:
             self.update_position(x, y, z)
-        self.is_moving = False
+        else:
+            self._done_event.set()
         return success
 
-    def move_relative(self, dx: float, dy: float, dz: float, speed: int = 50) -> bool:
-        """Mueve el brazo relativamente desde su posición actual."""
-        current = self.get_current_position()
+    def move_through(self, points, speed: int = 50, cancel_event: Optional[threading.Event] = None) -> bool:
+        """Recorre una serie de puntos (x, y, z) en comandos de trayectoria.
+        
+        Los puntos se envían en bloques de ROBOT_CONFIG['trajectory_chunk']; si cancel_event
+        se activa, el recorrido se detiene al terminar el bloque en curso y retorna False.
+        """
+        if len(points) == 0:
+            return True
+        
+        # Validar todos los puntos contra los límites del workspace de una vez
+        steps = np.clip(np.asarray(points, dtype=float), _LIMITS_LO, _LIMITS_HI).tolist()
+        
+        chunk = ROBOT_CONFIG['trajectory_chunk']
+        for first in range(0, len(steps), chunk):
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+            block = steps[first:first + chunk]
+            if not self._run_trajectory(block, speed):
+                return False
+            self.update_position(*block[-1], grip=self.current_position['grip'])
+        return True
+
+    def _run_trajectory(self, steps, speed: int) -> bool:
+        """Envía una trayectoria y espera su OK con un timeout acorde a su recorrido."""
+        start = (self.current_position['x'], self.current_position['y'], self.current_position['z'])
+        duration = _trajectory_duration(start, steps, speed, self.motor_acceleration)
+        timeout = duration * ROBOT_CONFIG['motion_timeout_margin'] + ROBOT_CONFIG['motion_timeout_extra']
+        
+        # send_trajectory desactiva el evento bajo el lock de comandos; el OK llega al terminar
+        if self.serial_connection.send_trajectory(steps, speed, timeout=timeout):
+            self._done_event.set()
+            return True
+        
+        # Sin OK el brazo puede seguir en movimiento: el evento queda pendiente del DONE
+        # o de la parada de emergencia, y la posición se vuelve a consultar
+        self.position_synced = False
+        if not self.serial_connection.is_connected:
+            self._done_event.set()
+        print(f"❌ La trayectoria no se completó (timeout de {timeout:.0f} s)")
+        return False
+
+    def move_relative(self, dx: float, dy: float, dz: float, speed: int = 50, force_sync: bool = False) -> bool:
+        """Mueve el brazo relativamente desde su posición actual.
+        
+        Usa la posición conocida tras el último movimiento; solo consulta al ESP32 si se
+        pide con force_sync o si la posición dejó de ser confiable (p. ej. tras una parada).
+        """
+        if force_sync or not self.position_synced:
+            current = self.sync_position()
+        else:
+            current = self.current_position
         new_x = current['x'] + dx
         new_y = current['y'] + dy
         new_z = current['z'] + dz
@@ -69,6 +161,8 @@ class RobotActions:
         acceleration = max(0, min(100, acceleration))
         command = f"A:{acceleration}"
         response = self.serial_connection.send_command(command)
+        if response and "OK" in response:
+            self.motor_acceleration = _map_range(acceleration, ROBOT_CONFIG['motor_accel_range'])
         return response and "OK" in response
 
     def open_grip(self, position: int = 100) -> bool:
@@ -89,45 +183,44 @@ class RobotActions:
 
     def emergency_stop(self) -> bool:
         """Ejecuta parada de emergencia."""
-        self.is_moving = False
+        self._done_event.set()
+        self.position_synced = False  # El brazo se detuvo a mitad de camino
         return self.serial_connection.emergency_stop()
 
-    def pick_and_place(self, pick_x: float, pick_y: float, place_x: float, place_y: float, z_height: float = 50) -> bool:
+    def pick_and_place(self, pick_x: float, pick_y: float, place_x: float, place_y: float, z_height: float = 50,
+                       speed: int = 50) -> bool:
         """Ejecuta una secuencia completa de recogida y colocación."""
         print(f"🤖 Iniciando secuencia pick & place...")
         
-        # 1. Ir a posición de recogida (arriba)
-        if not self.move_to_position(pick_x, pick_y, z_height):
-            return False
-        
-        # 2. Bajar para recoger
-        if not self.move_to_position(pick_x, pick_y, 0):
-            return False
+        # Puntos de la secuencia, validados contra los límites del workspace
+        pick_top, pick_bottom, place_top, place_bottom = np.clip(
+            np.array([
+                (pick_x, pick_y, z_height),
+                (pick_x, pick_y, 0),
+                (place_x, place_y, z_height),
+                (place_x, place_y, 0)
+            ], dtype=float),
+            _LIMITS_LO, _LIMITS_HI
+        ).tolist()
         
-        # 3. Cerrar pinza
-        if not self.close_grip():
-            return False
-        
-        # 4. Subir con objeto
-        if not self.move_to_position(pick_x, pick_y, z_height):
-            return False
-        
-        # 5. Ir a posición de colocación
-        if not self.move_to_position(place_x, place_y, z_height):
-            return False
-        
-        # 6. Bajar para colocar
-        if not self.move_to_position(place_x, place_y, 0):
-            return False
-        
-        # 7. Abrir pinza
-        if not self.open_grip():
-            return False
+        close_position, open_position = 0, 100
+        steps = [
+            pick_top,        # 1. Ir a posición de recogida (arriba)
+            pick_bottom,     # 2. Bajar para recoger
+            close_position,  # 3. Cerrar pinza
+            pick_top,        # 4. Subir con objeto
+            place_top,       # 5. Ir a posición de colocación
+            place_bottom,    # 6. Bajar para colocar
+            open_position,   # 7. Abrir pinza
+            place_top        # 8. Subir sin objeto
+        ]
         
-        # 8. Subir sin objeto
-        if not self.move_to_position(place_x, place_y, z_height):
+        # Enviar la secuencia completa en un solo comando
+        # El OK de la trayectoria llega cuando el ESP32 la terminó
+        if not self._run_trajectory(steps, speed):
             return False
         
+        self.update_position(*place_top, grip=open_position)
         print(f"✅ Secuencia pick & place completada")
         return True
 
@@ -145,10 +238,7 @@ class RobotActions:
 
     def wait_for_movement_complete(self, timeout: float = 30.0) -> bool:
         """Espera a que el movimiento se complete."""
-        start_time = time.time()
-        while self.is_moving and (time.time() - start_time) < timeout:
-            time.sleep(0.1)
-        return not self.is_moving
+        return self._done_event.wait(timeout)
 
     def get_status(self) -> Optional[dict]:
         """Obtiene el estado completo del brazo."""
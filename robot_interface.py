@@ -3,8 +3,10 @@ from tkinter import ttk, messagebox, filedialog
 import cv2
 from PIL import Image, ImageTk
 import threading
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import time
-from typing import Optional
 import numpy as np
 
 from robot_actions import RobotActions
@@ -14,6 +16,34 @@ from serial_communication import SerialConnection
 from config import GUI_CONFIG, CAMERA_CONFIG
 
 class RobotInterface:
+    # Botones de movimiento manual: (eje, (texto, dx, dy, dz) negativo, (texto, dx, dy, dz) positivo)
+    JOG_AXES = (
+        ("X", ("X-", -10, 0, 0), ("X+", 10, 0, 0)),
+        ("Y", ("Y-", 0, -10, 0), ("Y+", 0, 10, 0)),
+        ("Z", ("Z-", 0, 0, -10), ("Z+", 0, 0, 10)),
+    )
+    
+    # Atajos de teclado de la pestaña manual: tecla -> (dx, dy, dz)
+    JOG_KEYS = {
+        'a': (-10, 0, 0), 'd': (10, 0, 0),
+        's': (0, -10, 0), 'w': (0, 10, 0),
+        'e': (0, 0, -10), 'q': (0, 0, 10),
+    }
+    
+    # Filas de la posición actual: (texto, clave en position_vars)
+    POSITION_ROWS = (("X:", 'x'), ("Y:", 'y'), ("Z:", 'z'), ("Pinza:", 'grip'))
+    
+    # Rutinas automáticas disponibles en la lista
+    ROUTINES = (
+        "square_routine",
+        "circle_routine",
+        "pick_and_place_routine",
+        "vision_pick_routine",
+        "sorting_routine",
+        "inspection_routine",
+        "calibration_routine",
+    )
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Control de Brazo Robótico SCARA")
@@ -25,6 +55,18 @@ class RobotInterface:
         self.vision_enabled = False
         self.current_mode = "manual"  # manual, automatic
         self.update_interval = GUI_CONFIG['update_rate']
+        self.current_interval = self.update_interval  # Crece mientras no haya cambios
+        self.status_after_id = None
+        self.camera_after_id = None
+        self.last_position = None  # Última posición (x, y, z, grip) mostrada
+        self.last_routine_status = None
+        
+        # Posición consultada por un thread aparte; la interfaz solo lee esta referencia
+        self.position_snapshot = None
+        self.position_thread = None
+        self.position_stop = threading.Event()  # Detiene el thread de posición
+        self.connecting = False  # Hay una apertura del puerto en curso
+        self.position_polling_enabled = True
         
         # Inicializar componentes
         self.serial_connection = None
@@ -37,12 +79,46 @@ class RobotInterface:
         self.status_labels = {}
         self.position_vars = {}
         self.camera_images = {}  # Para almacenar las imágenes de tkinter
+        self.shown_frames = {}  # Último frame anotado dibujado por cámara
+        self.camera_probe_cache = None  # (instante, resultados) de la última prueba de cámaras
+        self.camera_messages = {}  # Texto de estado mostrado en cada canvas (None si hay imagen)
+        self.canvas_sizes = {}  # Tamaño de cada canvas de cámara, actualizado con <Configure>
+        self.preview_buffers = {}  # (ancho, alto) -> buffer BGR reutilizado para redimensionar
+        
+        # Cola de comandos del robot, atendida por un thread para no bloquear la interfaz
+        self.command_queue = queue.Queue()
+        self.command_thread = threading.Thread(target=self._command_worker, daemon=True)
+        self.command_thread.start()
+        # Líneas del log de rutinas pendientes de mostrar (se puede llenar desde cualquier thread)
+        self.log_queue = deque(maxlen=GUI_CONFIG['log_queue_size'])
+        
+        # Tareas lentas (abrir puerto, iniciar cámaras) fuera del thread de la interfaz
+        self.background_pool = ThreadPoolExecutor(max_workers=2)
+        self.jog_after_id = None  # Timer de repetición del botón de movimiento presionado
+        self.pending_delta = [0, 0, 0]  # Desplazamiento acumulado aún no enviado
+        self.move_flush_id = None
+        self.emergency_warning_open = False  # Evita apilar avisos si se repite Escape
+        
+        # Configurar estilos una sola vez, antes de crear los widgets que los usan
+        self.setup_styles()
         
         # Crear interfaz
         self.create_interface()
         
-        # Iniciar actualización de estado
+        # Cualquier interacción devuelve la actualización a su frecuencia base
+        self.root.bind_all('<ButtonPress>', lambda e: self.reset_update_interval(), add='+')
+        self.root.bind_all('<KeyPress>', lambda e: self.reset_update_interval(), add='+')
+        self.root.bind_all('<KeyPress>', self.on_key_press, add='+')
+        
+        # Iniciar actualización de estado y de cámaras (cada una a su propio ritmo)
         self.update_status()
+        self.update_camera_loop()
+        self.flush_log()
+
+    def setup_styles(self):
+        """Configura los estilos ttk de la interfaz."""
+        style = ttk.Style(self.root)
+        style.configure("Emergency.TButton", background="red", foreground="white")
 
     def create_interface(self):
         """Crea la interfaz gráfica completa."""
@@ -53,10 +129,12 @@ class RobotInterface:
         # Crear pestañas
         notebook = ttk.Notebook(main_frame)
         notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook = notebook
         
         # Pestaña de control manual
         manual_frame = self.create_manual_control_tab(notebook)
         notebook.add(manual_frame, text="Control Manual")
+        self.manual_tab = manual_frame
         
         # Pestaña de control automático
         automatic_frame = self.create_automatic_control_tab(notebook)
@@ -65,6 +143,7 @@ class RobotInterface:
         # Pestaña de visión artificial
         vision_frame = self.create_vision_tab(notebook)
         notebook.add(vision_frame, text="Visión Artificial")
+        self.vision_tab = vision_frame
         
         # Pestaña de configuración
         config_frame = self.create_config_tab(notebook)
@@ -72,6 +151,29 @@ class RobotInterface:
         
         # Barra de estado
         self.create_status_bar(main_frame)
+        
+        # Al cambiar de pestaña, actualizar de inmediato a la frecuencia base
+        notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+
+    def on_tab_changed(self, event=None):
+        """Reinicia la actualización de estado y de cámaras al cambiar de pestaña."""
+        self.reset_update_interval()
+        if self.status_after_id is not None:
+            self.root.after_cancel(self.status_after_id)
+            self.status_after_id = self.root.after_idle(self.update_status)
+        self.restart_camera_loop()
+
+    def reset_update_interval(self):
+        """Vuelve a la frecuencia base de actualización."""
+        self.current_interval = self.update_interval
+
+    def is_manual_tab_selected(self):
+        """Indica si la pestaña de control manual es la visible."""
+        return self.notebook.select() == str(self.manual_tab)
+
+    def is_vision_tab_selected(self):
+        """Indica si la pestaña de visión es la visible."""
+        return self.notebook.select() == str(self.vision_tab)
 
     def create_manual_control_tab(self, parent):
         """Crea la pestaña de control manual."""
@@ -94,17 +196,9 @@ class RobotInterface:
         }
         
         # Labels de posición
-        ttk.Label(pos_frame, text="X:").grid(row=0, column=0, sticky=tk.W)
-        ttk.Label(pos_frame, textvariable=self.position_vars['x']).grid(row=0, column=1, sticky=tk.W)
-        
-        ttk.Label(pos_frame, text="Y:").grid(row=1, column=0, sticky=tk.W)
-        ttk.Label(pos_frame, textvariable=self.position_vars['y']).grid(row=1, column=1, sticky=tk.W)
-        
-        ttk.Label(pos_frame, text="Z:").grid(row=2, column=0, sticky=tk.W)
-        ttk.Label(pos_frame, textvariable=self.position_vars['z']).grid(row=2, column=1, sticky=tk.W)
-        
-        ttk.Label(pos_frame, text="Pinza:").grid(row=3, column=0, sticky=tk.W)
-        ttk.Label(pos_frame, textvariable=self.position_vars['grip']).grid(row=3, column=1, sticky=tk.W)
+        for row, (label, key) in enumerate(self.POSITION_ROWS):
+            ttk.Label(pos_frame, text=label).grid(row=row, column=0, sticky=tk.W)
+            ttk.Label(pos_frame, textvariable=self.position_vars[key]).grid(row=row, column=1, sticky=tk.W)
         
         # Control de velocidad
         speed_frame = ttk.LabelFrame(control_frame, text="Control de Velocidad", padding=5)
@@ -119,26 +213,13 @@ class RobotInterface:
         movement_frame = ttk.LabelFrame(control_frame, text="Movimiento", padding=5)
         movement_frame.pack(fill=tk.X, pady=(0, 10))
         
-        # Botones de eje X
-        x_frame = ttk.Frame(movement_frame)
-        x_frame.pack(fill=tk.X, pady=2)
-        ttk.Button(x_frame, text="X-", command=lambda: self.move_relative(-10, 0, 0)).pack(side=tk.LEFT, padx=2)
-        ttk.Button(x_frame, text="X+", command=lambda: self.move_relative(10, 0, 0)).pack(side=tk.RIGHT, padx=2)
-        ttk.Label(x_frame, text="Eje X").pack(side=tk.TOP)
-        
-        # Botones de eje Y
-        y_frame = ttk.Frame(movement_frame)
-        y_frame.pack(fill=tk.X, pady=2)
-        ttk.Button(y_frame, text="Y-", command=lambda: self.move_relative(0, -10, 0)).pack(side=tk.LEFT, padx=2)
-        ttk.Button(y_frame, text="Y+", command=lambda: self.move_relative(0, 10, 0)).pack(side=tk.RIGHT, padx=2)
-        ttk.Label(y_frame, text="Eje Y").pack(side=tk.TOP)
-        
-        # Botones de eje Z
-        z_frame = ttk.Frame(movement_frame)
-        z_frame.pack(fill=tk.X, pady=2)
-        ttk.Button(z_frame, text="Z-", command=lambda: self.move_relative(0, 0, -10)).pack(side=tk.LEFT, padx=2)
-        ttk.Button(z_frame, text="Z+", command=lambda: self.move_relative(0, 0, 10)).pack(side=tk.RIGHT, padx=2)
-        ttk.Label(z_frame, text="Eje Z").pack(side=tk.TOP)
+        # Botones de cada eje (negativo a la izquierda, positivo a la derecha)
+        for axis, negative, positive in self.JOG_AXES:
+            axis_frame = ttk.Frame(movement_frame)
+            axis_frame.pack(fill=tk.X, pady=2)
+            self.create_jog_button(axis_frame, *negative).pack(side=tk.LEFT, padx=2)
+            self.create_jog_button(axis_frame, *positive).pack(side=tk.RIGHT, padx=2)
+            ttk.Label(axis_frame, text=f"Eje {axis}").pack(side=tk.TOP)
         
         # Control de pinza
         grip_frame = ttk.LabelFrame(control_frame, text="Control de Pinza", padding=5)
@@ -160,22 +241,25 @@ class RobotInterface:
         position_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
         
         # Entradas de posición
-        ttk.Label(position_frame, text="X:").grid(row=0, column=0, sticky=tk.W)
-        self.x_entry = ttk.Entry(position_frame)
-        self.x_entry.grid(row=0, column=1, padx=5, pady=2)
-        
-        ttk.Label(position_frame, text="Y:").grid(row=1, column=0, sticky=tk.W)
-        self.y_entry = ttk.Entry(position_frame)
-        self.y_entry.grid(row=1, column=1, padx=5, pady=2)
-        
-        ttk.Label(position_frame, text="Z:").grid(row=2, column=0, sticky=tk.W)
-        self.z_entry = ttk.Entry(position_frame)
-        self.z_entry.grid(row=2, column=1, padx=5, pady=2)
+        entries = []
+        for row, (label, _) in enumerate(self.POSITION_ROWS[:3]):
+            ttk.Label(position_frame, text=label).grid(row=row, column=0, sticky=tk.W)
+            entry = ttk.Entry(position_frame)
+            entry.grid(row=row, column=1, padx=5, pady=2)
+            entries.append(entry)
+        self.x_entry, self.y_entry, self.z_entry = entries
         
         ttk.Button(position_frame, text="Ir a Posición", command=self.go_to_position).grid(row=3, column=0, columnspan=2, pady=10)
         
         return frame
 
+    def create_jog_button(self, parent, text, dx, dy, dz):
+        """Crea un botón de movimiento relativo que repite el paso mientras se mantiene presionado."""
+        button = ttk.Button(parent, text=text)
+        button.bind('<ButtonPress-1>', lambda e: self.start_jog(dx, dy, dz))
+        button.bind('<ButtonRelease-1>', lambda e: self.stop_jog())
+        return button
+
     def create_automatic_control_tab(self, parent):
         """Crea la pestaña de control automático."""
         frame = ttk.Frame(parent)
@@ -188,18 +272,7 @@ class RobotInterface:
         self.routines_listbox = tk.Listbox(routines_frame, height=10)
         self.routines_listbox.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
         
-        routines = [
-            "square_routine",
-            "circle_routine", 
-            "pick_and_place_routine",
-            "vision_pick_routine",
-            "sorting_routine",
-            "inspection_routine",
-            "calibration_routine"
-        ]
-        
-        for routine in routines:
-            self.routines_listbox.insert(tk.END, routine)
+        self.routines_listbox.insert(tk.END, *self.ROUTINES)
         
         # Botones de control de rutinas
         routine_buttons_frame = ttk.Frame(routines_frame)
@@ -275,6 +348,7 @@ class RobotInterface:
         self.camera_x_canvas = tk.Canvas(camera_x_frame, bg='black', width=320, height=240, 
                                         highlightthickness=1, highlightbackground='gray')
         self.camera_x_canvas.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
+        self.camera_x_canvas.bind('<Configure>', self.on_camera_canvas_resize)
         
         # Cámara Y
         camera_y_frame = ttk.LabelFrame(cameras_frame, text="Cámara Y", padding=5)
@@ -284,6 +358,13 @@ class RobotInterface:
         self.camera_y_canvas = tk.Canvas(camera_y_frame, bg='black', width=320, height=240, 
                                         highlightthickness=1, highlightbackground='gray')
         self.camera_y_canvas.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
+        self.camera_y_canvas.bind('<Configure>', self.on_camera_canvas_resize)
+        
+        # Vistas de cámara recorridas en cada actualización: (cámara, título, canvas, activada)
+        self.camera_views = (
+            ('camera_x', "Cámara X", self.camera_x_canvas, self.camera_x_enabled),
+            ('camera_y', "Cámara Y", self.camera_y_canvas, self.camera_y_enabled),
+        )
         
         return frame
 
@@ -340,41 +421,127 @@ class RobotInterface:
         self.status_labels['uptime'] = ttk.Label(status_frame, text="Tiempo: 00:00:00")
         self.status_labels['uptime'].pack(side=tk.RIGHT, padx=5)
 
+    def run_in_background(self, work, on_done, *args):
+        """Ejecuta work(*args) en un thread y llama on_done(future) desde el thread de la interfaz."""
+        future = self.background_pool.submit(work, *args)
+        future.add_done_callback(lambda f: self._schedule_on_ui(on_done, f))
+        return future
+
+    def _schedule_on_ui(self, callback, *args):
+        """Programa un callback en el mainloop de tkinter."""
+        try:
+            self.root.after(0, callback, *args)
+        except (RuntimeError, tk.TclError):
+            pass  # La ventana ya se cerró
+
     def connect_robot(self):
         """Conecta al robot."""
+        # Ignorar clics repetidos mientras se abre el puerto o si ya hay conexión
+        if self.connecting or self.is_connected:
+            return
+        # No arrancar un segundo thread de posición mientras el anterior sigue vivo
+        if self.position_thread and self.position_thread.is_alive():
+            messagebox.showwarning("Conexión", "La conexión anterior aún se está cerrando")
+            return
+        port = self.port_var.get()
+        self.connecting = True
+        self.connection_status_var.set("Conectando...")
+        self.run_in_background(self._open_connection, self._finish_connect, port)
+
+    def _open_connection(self, port):
+        """Abre el puerto serial (se ejecuta fuera del thread de la interfaz)."""
+        connection = SerialConnection(port=port)
+        return connection if connection.open() else None
+
+    def _finish_connect(self, future):
+        """Completa la conexión en el thread de la interfaz."""
+        self.connecting = False
         try:
-            port = self.port_var.get()
-            self.serial_connection = SerialConnection(port=port)
-            
-            if self.serial_connection.open():
+            connection = future.result()
+            if connection:
+                self.serial_connection = connection
                 self.robot_actions = RobotActions(self.serial_connection)
                 self.robot_routines = RobotRoutines(self.robot_actions)
                 self.is_connected = True
                 self.connection_status_var.set("Conectado")
                 self.status_labels['connection'].config(text="Conectado")
+                
+                # Consultar la posición fuera del thread de la interfaz
+                self.position_stop.clear()
+                self.position_thread = threading.Thread(target=self._poll_position_loop, daemon=True)
+                self.position_thread.start()
+                
                 messagebox.showinfo("Conexión", "Robot conectado exitosamente")
             else:
+                self.connection_status_var.set("Desconectado")
                 messagebox.showerror("Error", "No se pudo conectar al robot")
         except Exception as e:
+            self.connection_status_var.set("Desconectado")
             messagebox.showerror("Error", f"Error de conexión: {e}")
 
     def disconnect_robot(self):
         """Desconecta del robot."""
         if self.serial_connection:
-            self.serial_connection.close()
             self.is_connected = False
-            self.connection_status_var.set("Desconectado")
-            self.status_labels['connection'].config(text="Desconectado")
-            messagebox.showinfo("Desconexión", "Robot desconectado")
+            self.connection_status_var.set("Desconectando...")
+            # Esperar al thread de posición puede tardar: se hace fuera del thread de la interfaz
+            self.run_in_background(self._close_connection, self._finish_disconnect, self.serial_connection)
+
+    def _close_connection(self, connection):
+        """Detiene el thread de posición y luego cierra el puerto serial."""
+        if not self._stop_position_thread():
+            print("⚠️ El thread de posición no terminó a tiempo; se cierra la conexión igualmente")
+        connection.close()
+
+    def _finish_disconnect(self, future):
+        """Completa la desconexión en el thread de la interfaz."""
+        try:
+            future.result()
+        except Exception as e:
+            print(f"❌ Error al desconectar: {e}")
+        self.connection_status_var.set("Desconectado")
+        self.status_labels['connection'].config(text="Desconectado")
+        messagebox.showinfo("Desconexión", "Robot desconectado")
+
+    def _stop_position_thread(self) -> bool:
+        """Detiene el thread de posición; retorna True si terminó.
+        
+        Puede estar esperando la respuesta de get_status con el lock de comandos tomado,
+        así que se espera más que el timeout de esa respuesta.
+        """
+        self.position_stop.set()
+        if self.position_thread and self.position_thread.is_alive():
+            self.position_thread.join(timeout=GUI_CONFIG['position_join_timeout'])
+        return not (self.position_thread and self.position_thread.is_alive())
+
+    def _poll_position_loop(self):
+        """Consulta periódicamente la posición del robot y publica una copia."""
+        while not self.position_stop.is_set():
+            if self.position_polling_enabled:
+                try:
+                    # Reasignar la referencia es atómico: no hace falta un lock
+                    self.position_snapshot = dict(self.robot_actions.get_current_position())
+                except Exception as e:
+                    print(f"❌ Error al consultar posición: {e}")
+            self.position_stop.wait(GUI_CONFIG['position_poll_interval'])
 
     def start_vision(self):
         """Inicia el sistema de visión."""
+        self.camera_probe_cache = None  # Las cámaras cambian de estado
+        self.status_labels['vision'].config(text="Visión: Iniciando...")
+        self.run_in_background(self._open_vision, self._finish_start_vision)
+
+    def _open_vision(self):
+        """Crea el sistema de visión e inicia la detección (fuera del thread de la interfaz)."""
+        vision_system = VisionSystem()
+        return vision_system, vision_system.start_detection()
+
+    def _finish_start_vision(self, future):
+        """Completa el inicio del sistema de visión en el thread de la interfaz."""
         try:
-            # Crear el sistema de visión
-            self.vision_system = VisionSystem()
+            self.vision_system, started = future.result()
             
-            # Intentar iniciar la detección
-            if self.vision_system.start_detection():
+            if started:
                 self.vision_enabled = True
                 self.status_labels['vision'].config(text="Visión: Activada")
                 
@@ -391,15 +558,18 @@ class RobotInterface:
                     messagebox.showwarning("Visión", "Sistema de visión iniciado pero no hay cámaras disponibles.")
             else:
                 self.vision_enabled = False
+                self.status_labels['vision'].config(text="Visión: Desactivada")
                 messagebox.showerror("Error", "No se pudo iniciar el sistema de visión. Verifica que las cámaras estén conectadas y disponibles.")
             
         except Exception as e:
             self.vision_enabled = False
+            self.status_labels['vision'].config(text="Visión: Desactivada")
             messagebox.showerror("Error", f"Error al iniciar visión: {e}")
             print(f"Error detallado: {e}")
 
     def stop_vision(self):
         """Detiene el sistema de visión."""
+        self.camera_probe_cache = None
         if self.vision_system:
             self.vision_system.stop_detection()
             self.vision_enabled = False
@@ -419,6 +589,7 @@ class RobotInterface:
             print("✅ Cámara X activada")
         else:
             print("❌ Cámara X desactivada")
+        self.restart_camera_loop()
 
     def toggle_camera_y(self):
         """Activa/desactiva la cámara Y."""
@@ -431,23 +602,27 @@ class RobotInterface:
             print("✅ Cámara Y activada")
         else:
             print("❌ Cámara Y desactivada")
+        self.restart_camera_loop()
 
     def get_canvas_size(self, canvas):
-        """Obtiene el tamaño real del canvas."""
-        canvas.update()  # Forzar actualización del canvas
-        return canvas.winfo_width(), canvas.winfo_height()
+        """Obtiene el tamaño real del canvas (actualizado por <Configure>)."""
+        size = self.canvas_sizes.get(canvas)
+        if size is None:
+            # Aún no hubo <Configure>: usar la geometría actual sin forzar un redibujado
+            size = (canvas.winfo_width(), canvas.winfo_height())
+        return size
 
-    def cv2_to_tkinter(self, cv_image):
-        """Convierte una imagen de OpenCV a formato compatible con tkinter."""
-        # Convertir de BGR a RGB
-        rgb_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
+    def cv2_to_tkinter(self, cv_image, tk_image=None):
+        """Convierte una imagen de OpenCV a formato compatible con tkinter.
         
-        # Obtener dimensiones del canvas (usar tamaño mínimo si no está disponible)
-        canvas_width = 520
-        canvas_height = 440
+        Si se pasa tk_image y tiene el mismo tamaño, se copia el frame en ella
+        en lugar de crear una PhotoImage nueva.
+        """
+        # Tamaño máximo de la vista previa
+        canvas_width, canvas_height = GUI_CONFIG['preview_size']
         
         # Obtener dimensiones de la imagen original
-        height, width = rgb_image.shape[:2]
+        height, width = cv_image.shape[:2]
         
         # Calcular factor de escala para mantener proporción
         scale_x = canvas_width / width
@@ -458,158 +633,185 @@ class RobotInterface:
         new_width = int(width * scale)
         new_height = int(height * scale)
         
-        # Redimensionar la imagen
-        resized_image = cv2.resize(rgb_image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+        # Redimensionar primero para procesar solo los píxeles que se muestran
+        resized_image = self.preview_buffers.get((new_width, new_height))
+        if resized_image is None:
+            resized_image = np.empty((new_height, new_width, 3), dtype=np.uint8)
+            self.preview_buffers[(new_width, new_height)] = resized_image
+        cv2.resize(cv_image, (new_width, new_height), dst=resized_image, interpolation=cv2.INTER_AREA)
         
-        # Convertir a PIL Image
-        pil_image = Image.fromarray(resized_image)
+        # Convertir a PIL Image; el decodificador 'raw' de PIL invierte BGR->RGB al leer el buffer
+        pil_image = Image.frombuffer('RGB', (new_width, new_height), resized_image, 'raw', 'BGR', 0, 1)
         
-        # Convertir a PhotoImage
-        tk_image = ImageTk.PhotoImage(pil_image)
+        # Reutilizar la PhotoImage existente si el tamaño coincide
+        if tk_image is not None and tk_image.width() == new_width and tk_image.height() == new_height:
+            tk_image.paste(pil_image)
+        else:
+            tk_image = ImageTk.PhotoImage(pil_image)
         
         return tk_image, new_width, new_height
 
+    def show_camera_frame(self, camera_name, canvas, frame):
+        """Dibuja un frame en el canvas de una cámara reutilizando su imagen."""
+        previous_image = self.camera_images.get(camera_name)
+        
+        # El sistema de visión publica un array nuevo por detección: si es el mismo, no redibujar
+        if previous_image is not None and frame is self.shown_frames.get(camera_name):
+            return
+        self.shown_frames[camera_name] = frame
+        
+        tk_image, _, _ = self.cv2_to_tkinter(frame, previous_image)
+        
+        if tk_image is not previous_image:
+            # Primera imagen o cambio de tamaño: crear el item del canvas y centrarlo;
+            # en los demás frames paste() actualiza la imagen en su lugar
+            self.camera_images[camera_name] = tk_image  # Mantener referencia
+            self.camera_messages[camera_name] = None
+            canvas.delete("all")
+            canvas.create_image(0, 0, anchor=tk.NW, image=tk_image, tags="frame")
+            self.center_camera_frame(canvas)
+
+    def on_camera_canvas_resize(self, event):
+        """Guarda el nuevo tamaño del canvas y vuelve a centrar su imagen."""
+        self.canvas_sizes[event.widget] = (event.width, event.height)
+        self.center_camera_frame(event.widget)
+
+    def center_camera_frame(self, canvas):
+        """Centra la imagen de la cámara en su canvas."""
+        bbox = canvas.bbox("frame")
+        if bbox is None:
+            return
+        
+        canvas_width, canvas_height = self.get_canvas_size(canvas)
+        if canvas_width <= 1 or canvas_height <= 1:
+            canvas_width, canvas_height = 320, 240  # Usar tamaño por defecto
+        width, height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        canvas.coords("frame", (canvas_width - width) // 2, (canvas_height - height) // 2)
+
+    def show_camera_message(self, camera_name, canvas, text, color):
+        """Muestra un texto de estado en el canvas de una cámara si no es el que ya está."""
+        if self.camera_messages.get(camera_name) == text:
+            return
+        self.camera_messages[camera_name] = text
+        self.camera_images[camera_name] = None  # El próximo frame vuelve a crear la imagen
+        canvas.delete("all")
+        canvas.create_text(160, 120, text=text, fill=color, font=("Arial", 12), anchor=tk.CENTER)
+
     def update_camera_views(self):
         """Actualiza las vistas de las cámaras."""
-        if not self.vision_enabled or not self.vision_system:
-            # Mostrar mensaje de estado en los canvas
-            self.camera_x_canvas.delete("all")
-            self.camera_x_canvas.create_text(160, 120, text="Cámara X\nNo disponible", 
-                                           fill="white", font=("Arial", 12), anchor=tk.CENTER)
-            
-            self.camera_y_canvas.delete("all")
-            self.camera_y_canvas.create_text(160, 120, text="Cámara Y\nNo disponible", 
-                                           fill="white", font=("Arial", 12), anchor=tk.CENTER)
-            return
-            
-        try:
-            # Actualizar cámara X si está activada
-            if self.camera_x_enabled.get():
-                # Usar frame con detecciones y rejilla de coordenadas
-                frame_x = self.vision_system.get_frame_with_detections("camera_x")
-                if frame_x is not None:
-                    # Solo actualizar si hay un frame nuevo
-                    if 'camera_x' not in self.camera_images or self.camera_images['camera_x'] is None:
-                        tk_image_x, width_x, height_x = self.cv2_to_tkinter(frame_x)
-                        self.camera_images['camera_x'] = tk_image_x  # Mantener referencia
-                        
-                        # Limpiar canvas y mostrar imagen centrada
-                        self.camera_x_canvas.delete("all")
-                        
-                        # Obtener tamaño real del canvas
-                        canvas_width, canvas_height = self.get_canvas_size(self.camera_x_canvas)
-                        if canvas_width <= 1 or canvas_height <= 1:
-                            canvas_width, canvas_height = 320, 240  # Usar tamaño por defecto
-                        
-                        # Centrar la imagen
-                        x_offset = (canvas_width - width_x) // 2
-                        y_offset = (canvas_height - height_x) // 2
-                        self.camera_x_canvas.create_image(x_offset, y_offset, anchor=tk.NW, image=tk_image_x)
-                    else:
-                        # Actualizar frame existente
-                        tk_image_x, width_x, height_x = self.cv2_to_tkinter(frame_x)
-                        self.camera_images['camera_x'] = tk_image_x
-                        
-                        # Actualizar imagen sin limpiar todo el canvas
-                        canvas_width, canvas_height = self.get_canvas_size(self.camera_x_canvas)
-                        if canvas_width <= 1 or canvas_height <= 1:
-                            canvas_width, canvas_height = 320, 240
-                        
-                        x_offset = (canvas_width - width_x) // 2
-                        y_offset = (canvas_height - height_x) // 2
-                        
-                        # Actualizar solo la imagen, no todo el canvas
-                        self.camera_x_canvas.delete("image_x")
-                        self.camera_x_canvas.create_image(x_offset, y_offset, anchor=tk.NW, 
-                                                        image=tk_image_x, tags="image_x")
-                else:
-                    # Mostrar mensaje si no hay frame disponible
-                    if 'camera_x' not in self.camera_images or self.camera_images['camera_x'] is not None:
-                        self.camera_images['camera_x'] = None
-                        self.camera_x_canvas.delete("all")
-                        self.camera_x_canvas.create_text(160, 120, text="Cámara X\nSin señal", 
-                                                       fill="white", font=("Arial", 12), anchor=tk.CENTER)
-            else:
-                # Mostrar mensaje de cámara desactivada
-                if 'camera_x' not in self.camera_images or self.camera_images['camera_x'] is not None:
-                    self.camera_images['camera_x'] = None
-                    self.camera_x_canvas.delete("all")
-                    self.camera_x_canvas.create_text(160, 120, text="Cámara X\nDesactivada", 
-                                                   fill="gray", font=("Arial", 12), anchor=tk.CENTER)
+        vision_ready = self.vision_enabled and self.vision_system
+        
+        for camera_name, title, canvas, enabled_var in self.camera_views:
+            if not vision_ready:
+                self.show_camera_message(camera_name, canvas, f"{title}\nNo disponible", "white")
+                continue
             
-            # Actualizar cámara Y si está activada
-            if self.camera_y_enabled.get():
+            try:
+                if not enabled_var.get():
+                    self.show_camera_message(camera_name, canvas, f"{title}\nDesactivada", "gray")
+                    continue
+                
                 # Usar frame con detecciones y rejilla de coordenadas
-                frame_y = self.vision_system.get_frame_with_detections("camera_y")
-                if frame_y is not None:
-                    # Solo actualizar si hay un frame nuevo
-                    if 'camera_y' not in self.camera_images or self.camera_images['camera_y'] is None:
-                        tk_image_y, width_y, height_y = self.cv2_to_tkinter(frame_y)
-                        self.camera_images['camera_y'] = tk_image_y  # Mantener referencia
-                        
-                        # Limpiar canvas y mostrar imagen centrada
-                        self.camera_y_canvas.delete("all")
-                        
-                        # Obtener tamaño real del canvas
-                        canvas_width, canvas_height = self.get_canvas_size(self.camera_y_canvas)
-                        if canvas_width <= 1 or canvas_height <= 1:
-                            canvas_width, canvas_height = 320, 240  # Usar tamaño por defecto
-                        
-                        # Centrar la imagen
-                        x_offset = (canvas_width - width_y) // 2
-                        y_offset = (canvas_height - height_y) // 2
-                        self.camera_y_canvas.create_image(x_offset, y_offset, anchor=tk.NW, image=tk_image_y)
-                    else:
-                        # Actualizar frame existente
-                        tk_image_y, width_y, height_y = self.cv2_to_tkinter(frame_y)
-                        self.camera_images['camera_y'] = tk_image_y
-                        
-                        # Actualizar imagen sin limpiar todo el canvas
-                        canvas_width, canvas_height = self.get_canvas_size(self.camera_y_canvas)
-                        if canvas_width <= 1 or canvas_height <= 1:
-                            canvas_width, canvas_height = 320, 240
-                        
-                        x_offset = (canvas_width - width_y) // 2
-                        y_offset = (canvas_height - height_y) // 2
-                        
-                        # Actualizar solo la imagen, no todo el canvas
-                        self.camera_y_canvas.delete("image_y")
-                        self.camera_y_canvas.create_image(x_offset, y_offset, anchor=tk.NW, 
-                                                        image=tk_image_y, tags="image_y")
+                frame = self.vision_system.get_frame_with_detections(camera_name)
+                if frame is not None:
+                    self.show_camera_frame(camera_name, canvas, frame)
                 else:
-                    # Mostrar mensaje si no hay frame disponible
-                    if 'camera_y' not in self.camera_images or self.camera_images['camera_y'] is not None:
-                        self.camera_images['camera_y'] = None
-                        self.camera_y_canvas.delete("all")
-                        self.camera_y_canvas.create_text(160, 120, text="Cámara Y\nSin señal", 
-                                                       fill="white", font=("Arial", 12), anchor=tk.CENTER)
-            else:
-                # Mostrar mensaje de cámara desactivada
-                if 'camera_y' not in self.camera_images or self.camera_images['camera_y'] is not None:
-                    self.camera_images['camera_y'] = None
-                    self.camera_y_canvas.delete("all")
-                    self.camera_y_canvas.create_text(160, 120, text="Cámara Y\nDesactivada", 
-                                                   fill="gray", font=("Arial", 12), anchor=tk.CENTER)
-                
-        except Exception as e:
-            print(f"Error al actualizar vistas de cámara: {e}")
-            # Mostrar mensaje de error en los canvas
-            self.camera_x_canvas.delete("all")
-            self.camera_x_canvas.create_text(160, 120, text="Cámara X\nError", 
-                                           fill="red", font=("Arial", 12), anchor=tk.CENTER)
-            
-            self.camera_y_canvas.delete("all")
-            self.camera_y_canvas.create_text(160, 120, text="Cámara Y\nError", 
-                                           fill="red", font=("Arial", 12), anchor=tk.CENTER)
+                    self.show_camera_message(camera_name, canvas, f"{title}\nSin señal", "white")
+                    
+            except Exception as e:
+                print(f"Error al actualizar vista de {camera_name}: {e}")
+                self.show_camera_message(camera_name, canvas, f"{title}\nError", "red")
+
+    def _command_worker(self):
+        """Ejecuta en orden los comandos encolados para el robot."""
+        while True:
+            action, args = self.command_queue.get()
+            try:
+                action(*args)
+            except Exception as e:
+                print(f"❌ Error al ejecutar comando: {e}")
+
+    def send_robot_command(self, action, *args):
+        """Encola un comando del robot para ejecutarlo fuera del thread de la interfaz."""
+        self.command_queue.put((action, args))
+
+    def clear_pending_commands(self):
+        """Descarta los comandos del robot que aún no se han enviado."""
+        if self.move_flush_id is not None:
+            self.root.after_cancel(self.move_flush_id)
+            self.move_flush_id = None
+        self.pending_delta = [0, 0, 0]
+        try:
+            while True:
+                self.command_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def on_key_press(self, event):
+        """Despacha los atajos de teclado (un solo binding para todas las teclas)."""
+        # La parada de emergencia responde también en campos de texto y otras ventanas,
+        # salvo en los diálogos que usan Escape para cancelar
+        widget = event.widget
+        if event.keysym == 'Escape':
+            if not self._has_own_escape(widget):
+                self.emergency_stop()
+            return
+        
+        # Ignorar el resto de teclas de otras ventanas y de los campos de texto
+        text_inputs = (tk.Entry, ttk.Entry, tk.Text, tk.Spinbox, ttk.Spinbox, ttk.Combobox)
+        if not isinstance(widget, tk.Misc) or isinstance(widget, text_inputs):
+            return
+        if widget.winfo_toplevel() is not self.root:
+            return
+        
+        delta = self.JOG_KEYS.get(event.keysym.lower())
+        if delta and self.is_connected and self.is_manual_tab_selected():
+            self.move_relative(*delta)
+
+    def _has_own_escape(self, widget) -> bool:
+        """Indica si la ventana del widget define su propio Escape (p. ej. cancelar un diálogo)."""
+        if not isinstance(widget, tk.Misc):
+            return False
+        toplevel = widget.winfo_toplevel()
+        return toplevel is not self.root and bool(toplevel.bind('<Escape>'))
+
+    def start_jog(self, dx, dy, dz):
+        """Inicia el movimiento relativo y lo repite mientras el botón siga presionado."""
+        self.stop_jog()
+        if not self.move_relative(dx, dy, dz):
+            return
+        self.jog_after_id = self.root.after(GUI_CONFIG['jog_repeat_ms'], self.start_jog, dx, dy, dz)
+
+    def stop_jog(self):
+        """Detiene la repetición del movimiento relativo."""
+        if self.jog_after_id is not None:
+            self.root.after_cancel(self.jog_after_id)
+            self.jog_after_id = None
 
     def move_relative(self, dx, dy, dz):
         """Mueve el robot relativamente."""
         if not self.is_connected:
             messagebox.showwarning("Advertencia", "Robot no conectado")
-            return
+            return False
             
+        # Acumular el desplazamiento y enviarlo como un solo comando a ritmo limitado
+        self.pending_delta[0] += dx
+        self.pending_delta[1] += dy
+        self.pending_delta[2] += dz
+        if self.move_flush_id is None:
+            delay = max(1, int(1000 / GUI_CONFIG['jog_max_hz']))
+            self.move_flush_id = self.root.after(delay, self._flush_move)
+        return True
+
+    def _flush_move(self):
+        """Envía el desplazamiento relativo acumulado."""
+        self.move_flush_id = None
+        dx, dy, dz = self.pending_delta
+        self.pending_delta = [0, 0, 0]
+        if not self.is_connected or (dx == 0 and dy == 0 and dz == 0):
+            return
         speed = self.speed_var.get()
-        self.robot_actions.move_relative(dx, dy, dz, speed)
+        self.send_robot_command(self.robot_actions.move_relative, dx, dy, dz, speed)
 
     def go_to_position(self):
         """Va a una posición específica."""
@@ -623,7 +825,7 @@ class RobotInterface:
             z = float(self.z_entry.get())
             speed = self.speed_var.get()
             
-            self.robot_actions.move_to_position(x, y, z, speed)
+            self.send_robot_command(self.robot_actions.move_to_position, x, y, z, speed)
         except ValueError:
             messagebox.showerror("Error", "Valores de posición inválidos")
 
@@ -633,7 +835,7 @@ class RobotInterface:
             messagebox.showwarning("Advertencia", "Robot no conectado")
             return
             
-        self.robot_actions.home_position()
+        self.send_robot_command(self.robot_actions.home_position)
 
     def open_grip(self):
         """Abre la pinza."""
@@ -641,7 +843,7 @@ class RobotInterface:
             messagebox.showwarning("Advertencia", "Robot no conectado")
             return
             
-        self.robot_actions.open_grip()
+        self.send_robot_command(self.robot_actions.open_grip)
 
     def close_grip(self):
         """Cierra la pinza."""
@@ -649,13 +851,26 @@ class RobotInterface:
             messagebox.showwarning("Advertencia", "Robot no conectado")
             return
             
-        self.robot_actions.close_grip()
+        self.send_robot_command(self.robot_actions.close_grip)
 
     def emergency_stop(self):
         """Parada de emergencia."""
-        if self.robot_routines:
-            self.robot_routines.emergency_stop()
-        messagebox.showwarning("Emergencia", "Parada de emergencia ejecutada")
+        # La parada no espera en la cola: se descartan los comandos pendientes
+        self.stop_jog()
+        self.clear_pending_commands()
+        if not (self.is_connected and self.robot_routines):
+            print("⚠️ Parada de emergencia sin robot conectado: no se envió ningún comando")
+            return
+        self.robot_routines.emergency_stop()
+        
+        # Escape dentro del propio aviso vuelve a parar el brazo, pero no abre otro aviso
+        if self.emergency_warning_open:
+            return
+        self.emergency_warning_open = True
+        try:
+            messagebox.showwarning("Emergencia", "Parada de emergencia ejecutada")
+        finally:
+            self.emergency_warning_open = False
 
     def execute_routine(self):
         """Ejecuta la rutina seleccionada."""
@@ -676,13 +891,36 @@ class RobotInterface:
         
         success = self.robot_routines.start_routine(routine_name)
         if success:
+            self.log_routine(f"▶️ Rutina iniciada: {routine_name}")
             self.routine_status_var.set(f"Ejecutando: {routine_name}")
             self.status_labels['routine'].config(text=f"Rutina: {routine_name}")
 
+    def log_routine(self, message):
+        """Agrega una línea al log de rutinas; se muestra en el siguiente refresco."""
+        self.log_queue.append(message + "\n")
+
+    def flush_log(self):
+        """Inserta de una vez las líneas acumuladas en el log de rutinas."""
+        lines = []
+        try:
+            while True:
+                lines.append(self.log_queue.popleft())
+        except IndexError:
+            pass
+        
+        if lines:
+            self.routine_log.insert(tk.END, "".join(lines))
+            # Conservar solo las últimas líneas para que el widget no crezca sin límite
+            self.routine_log.delete("1.0", f"end-{GUI_CONFIG['log_max_lines']}l")
+            self.routine_log.see(tk.END)
+        
+        self.root.after(GUI_CONFIG['log_flush_ms'], self.flush_log)
+
     def stop_routine(self):
         """Detiene la rutina actual."""
         if self.robot_routines:
             self.robot_routines.stop_routine()
+            self.log_routine("⏹️ Rutina detenida")
             self.routine_status_var.set("Sin rutina activa")
             self.status_labels['routine'].config(text="Rutina: Ninguna")
 
@@ -839,23 +1077,20 @@ class RobotInterface:
                 if len(squares) >= 2:
                     distance_info.append(f"  Cuadrados detectados: {len(squares)}")
                     
-                    # Calcular todas las distancias
-                    for i in range(len(squares)):
-                        for j in range(i + 1, len(squares)):
-                            square1 = squares[i]
-                            square2 = squares[j]
-                            
-                            # Calcular distancia
-                            if self.vision_system.is_calibrated:
-                                distance = self.vision_system.calculate_distance_cm(square1.center, square2.center, camera_name)
-                                unit = "cm"
-                            else:
-                                distance = np.sqrt((square2.center[0] - square1.center[0])**2 + 
-                                                 (square2.center[1] - square1.center[1])**2)
-                                unit = "px"
-                            
-                            info = f"  • {square1.color} → {square2.color}: {distance:.1f}{unit}"
-                            distance_info.append(info)
+                    # Calcular todas las distancias de una vez (matriz de pares)
+                    centers = np.array([square.center for square in squares], dtype=np.float64)
+                    diffs = centers[:, None, :] - centers[None, :, :]
+                    distances = np.hypot(diffs[..., 0], diffs[..., 1])
+                    if self.vision_system.is_calibrated:
+                        distances = self.vision_system.pixels_to_cm(distances, camera_name)
+                        unit = "cm"
+                    else:
+                        unit = "px"
+                    
+                    rows, cols = np.triu_indices(len(squares), k=1)
+                    for i, j, distance in zip(rows.tolist(), cols.tolist(), distances[rows, cols].tolist()):
+                        info = f"  • {squares[i].color} → {squares[j].color}: {distance:.1f}{unit}"
+                        distance_info.append(info)
                 elif len(squares) == 1:
                     distance_info.append(f"  Solo 1 cuadrado detectado ({squares[0].color})")
                 else:
@@ -905,25 +1140,53 @@ class RobotInterface:
 
     def test_cameras(self):
         """Prueba las cámaras individualmente y muestra información de debug."""
-        camera_info = []
-        
-        # Probar todas las cámaras configuradas
-        for camera_name, camera_config in CAMERA_CONFIG.items():
-            try:
-                cap = cv2.VideoCapture(camera_config['index'])
-                if cap.isOpened():
-                    # Intentar leer un frame
-                    ret, frame = cap.read()
-                    if ret:
-                        height, width = frame.shape[:2]
-                        camera_info.append(f"✅ {camera_name}: Índice {camera_config['index']}, Resolución {width}x{height}")
-                    else:
-                        camera_info.append(f"⚠️ {camera_name}: Índice {camera_config['index']}, No puede leer frames")
-                    cap.release()
-                else:
-                    camera_info.append(f"❌ {camera_name}: Índice {camera_config['index']}, No disponible")
-            except Exception as e:
-                camera_info.append(f"❌ {camera_name}: Error - {e}")
+        # Reutilizar la última prueba si es reciente: reabrir las cámaras tarda
+        if self.camera_probe_cache is not None:
+            probe_time, probe_info = self.camera_probe_cache
+            if time.monotonic() - probe_time < GUI_CONFIG['camera_probe_ttl']:
+                self._show_camera_test(probe_info)
+                return
+        
+        # Abrir cada cámara tarda; se prueban en paralelo fuera del thread de la interfaz
+        self.run_in_background(self._probe_cameras, self._finish_camera_probe)
+
+    def _probe_cameras(self):
+        """Prueba todas las cámaras configuradas a la vez."""
+        with ThreadPoolExecutor(max_workers=len(CAMERA_CONFIG)) as pool:
+            return list(pool.map(self._probe_camera, CAMERA_CONFIG.items()))
+
+    def _probe_camera(self, camera_item):
+        """Prueba una cámara y devuelve la línea de resultado."""
+        camera_name, camera_config = camera_item
+        try:
+            # Con el sistema de visión iniciado se usa su captura en lugar de reabrir la cámara
+            vision_system = self.vision_system
+            if vision_system:
+                result = vision_system.probe_camera(camera_name)
+            else:
+                result = VisionSystem.probe_camera_index(camera_config['index'])
+            
+            if result['readable']:
+                width, height = result['resolution']
+                return f"✅ {camera_name}: Índice {camera_config['index']}, Resolución {width}x{height}"
+            if result['opened']:
+                return f"⚠️ {camera_name}: Índice {camera_config['index']}, No puede leer frames"
+            return f"❌ {camera_name}: Índice {camera_config['index']}, No disponible"
+        except Exception as e:
+            return f"❌ {camera_name}: Error - {e}"
+
+    def _finish_camera_probe(self, future):
+        """Guarda el resultado de la prueba de cámaras y lo muestra."""
+        try:
+            probe_info = future.result()
+            self.camera_probe_cache = (time.monotonic(), probe_info)
+        except Exception as e:
+            probe_info = [f"❌ Error al probar cámaras: {e}"]
+        self._show_camera_test(probe_info)
+
+    def _show_camera_test(self, probe_info):
+        """Muestra el resultado de la prueba de cámaras en el thread de la interfaz."""
+        camera_info = list(probe_info)
         
         # Agregar información del estado de la interfaz
         camera_info.append(f"\nEstado de la interfaz:")
@@ -965,45 +1228,113 @@ class RobotInterface:
             if filename:
                 self.vision_system.load_calibration(filename)
 
+    def update_camera_loop(self):
+        """Refresca las vistas de cámara, independiente de la actualización de estado."""
+        # Con la pestaña de visión oculta no se dibuja nada; al volver a ella se reanuda
+        cameras_active = False
+        if self.is_vision_tab_selected():
+            self.update_camera_views()
+            cameras_active = self.vision_enabled and (self.camera_x_enabled.get() or self.camera_y_enabled.get())
+        
+        # Sin vistas activas solo se revisa de vez en cuando si hay que mostrarlas
+        interval = GUI_CONFIG['camera_update_rate'] if cameras_active else GUI_CONFIG['max_update_interval']
+        self.camera_after_id = self.root.after(interval, self.update_camera_loop)
+
+    def restart_camera_loop(self):
+        """Refresca las cámaras de inmediato en lugar de esperar el intervalo lento."""
+        if self.camera_after_id is not None:
+            self.root.after_cancel(self.camera_after_id)
+        self.camera_after_id = self.root.after_idle(self.update_camera_loop)
+
     def update_status(self):
         """Actualiza el estado de la interfaz."""
-        # Actualizar posición si está conectado
-        if self.is_connected and self.robot_actions:
-            try:
-                position = self.robot_actions.get_current_position()
-                self.position_vars['x'].set(f"{position['x']:.1f}")
-                self.position_vars['y'].set(f"{position['y']:.1f}")
-                self.position_vars['z'].set(f"{position['z']:.1f}")
-                self.position_vars['grip'].set(str(position['grip']))
-            except:
-                pass
+        changed = False
+        
+        # Actualizar posición (solo se consulta mientras la pestaña manual es visible)
+        self.position_polling_enabled = self.is_manual_tab_selected()
+        position = self.position_snapshot
+        if self.is_connected and position is not None:
+            current = (position['x'], position['y'], position['z'], position['grip'])
+            if current != self.last_position:
+                # Escribir solo los ejes que cambiaron; cada set() es una llamada a Tcl
+                previous = self.last_position or (None, None, None, None)
+                self.last_position = current
+                for key, value, old_value in zip(('x', 'y', 'z'), current, previous):
+                    if value != old_value:
+                        self.position_vars[key].set(f"{value:.1f}")
+                if current[3] != previous[3]:
+                    self.position_vars['grip'].set(str(current[3]))
+                changed = True
         
         # Actualizar estado de rutinas
         if self.robot_routines:
-            status = self.robot_routines.get_routine_status()
-            if status['is_running']:
-                self.routine_status_var.set(f"Ejecutando: {status['current_routine']}")
-            else:
-                self.routine_status_var.set("Sin rutina activa")
-        
-        # Actualizar vistas de cámara
-        self.update_camera_views()
+            status = self.robot_routines.get_routine_status(include_position=False)
+            routine_status = (status['is_running'], status['current_routine'])
+            if routine_status != self.last_routine_status:
+                self.last_routine_status = routine_status
+                if status['is_running']:
+                    self.routine_status_var.set(f"Ejecutando: {status['current_routine']}")
+                else:
+                    self.routine_status_var.set("Sin rutina activa")
+                changed = True
         
         # Actualizar tiempo de ejecución
         # (implementar contador de tiempo)
         
+        # Sin cambios, espaciar las actualizaciones hasta el máximo
+        if changed:
+            self.reset_update_interval()
+        else:
+            self.current_interval = min(self.current_interval * 2, GUI_CONFIG['max_update_interval'])
+        
         # Programar próxima actualización
-        self.root.after(self.update_interval, self.update_status)
+        self.status_after_id = self.root.after(self.current_interval, self.update_status)
 
     def on_closing(self):
         """Maneja el cierre de la aplicación."""
+        self.stop_jog()
+        self.clear_pending_commands()
+        if self.status_after_id is not None:
+            self.root.after_cancel(self.status_after_id)
+        if self.camera_after_id is not None:
+            self.root.after_cancel(self.camera_after_id)
+        self.is_connected = False
+        self.vision_enabled = False
+        
+        # Detener la visión en paralelo con el brazo. El brazo va en orden: rutina, thread de
+        # posición y por último la conexión, para no cerrar el puerto mientras se escribe en él.
+        # Cada paso tiene su propio timeout, así que se espera a que terminen todos: la ventana
+        # no se destruye antes de cerrar el puerto
+        shutdown_tasks = []
         if self.vision_system:
-            self.stop_vision()
+            shutdown_tasks.append(self.vision_system.stop_detection)
+        if self.robot_routines or self.serial_connection:
+            shutdown_tasks.append(self._shutdown_robot)
+        if shutdown_tasks:
+            shutdown_pool = ThreadPoolExecutor(max_workers=len(shutdown_tasks))
+            wait([shutdown_pool.submit(task) for task in shutdown_tasks])
+            shutdown_pool.shutdown(wait=False)
+        self.background_pool.shutdown(wait=False)
+        
+        # Soltar las PhotoImage antes de destruir la ventana
+        self.camera_images.clear()
+        self.root.destroy()
+
+    def _shutdown_robot(self):
+        """Detiene la rutina y el thread de posición y, cuando terminaron, cierra la conexión serial."""
         if self.robot_routines:
-            self.stop_routine()
+            # Una rutina puede estar esperando el OK de una trayectoria larga: parar el brazo
+            # (la escritura no espera al lock de comandos) para que no siga moviéndose solo
+            if self.robot_routines.is_running and self.serial_connection and self.serial_connection.is_connected:
+                self.robot_actions.emergency_stop()
+            self.robot_routines.stop_routine(timeout=GUI_CONFIG['shutdown_timeout'])
+            routine_thread = self.robot_routines.routine_thread
+            if routine_thread and routine_thread.is_alive():
+                print("⚠️ La rutina no terminó a tiempo; se cierra la conexión igualmente")
+        if not self._stop_position_thread():
+            print("⚠️ El thread de posición no terminó a tiempo; se cierra la conexión igualmente")
         if self.serial_connection:
-            self.disconnect_robot()
-        self.root.destroy()
+            self.serial_connection.close()
 
 def main():
     root = tk.Tk()
@@ -1012,10 +1343,6 @@ def main():
     # Configurar cierre de ventana
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     
-    # Configurar estilo para botón de emergencia
-    style = ttk.Style()
-    style.configure("Emergency.TButton", background="red", foreground="white")
-    
     root.mainloop()
 
 if __name__ == "__main__":
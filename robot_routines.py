@@ -1,5 +1,5 @@
-import time
 import threading
+import numpy as np
 from typing import List, Optional, Dict
 from robot_actions import RobotActions
 from vision_system import VisionSystem, DetectedObject
@@ -12,18 +12,32 @@ class RobotRoutines:
         self.is_running = False
         self.current_routine = None
         self.routine_thread = None
+        # Se activa al pedir la detención; las pausas de las rutinas esperan sobre él
+        self.cancel_event = threading.Event()
+        
+        # Rutinas que se pueden iniciar por nombre (los métodos de control quedan fuera)
+        self.routines = {
+            name: getattr(self, name)
+            for name in dir(type(self))
+            if name.endswith('_routine') and not name.startswith('_')
+            and name not in ('start_routine', 'stop_routine')
+        }
 
     def start_routine(self, routine_name: str, *args, **kwargs) -> bool:
         """Inicia una rutina automática en un thread separado."""
         if self.is_running:
             print("⚠️ Ya hay una rutina ejecutándose")
             return False
+        if self.routine_thread and self.routine_thread.is_alive():
+            print("⚠️ La rutina anterior aún se está deteniendo")
+            return False
 
-        routine_method = getattr(self, routine_name, None)
+        routine_method = self.routines.get(routine_name)
         if not routine_method:
             print(f"❌ Rutina '{routine_name}' no encontrada")
             return False
 
+        self.cancel_event.clear()
         self.is_running = True
         self.current_routine = routine_name
         
@@ -37,11 +51,16 @@ class RobotRoutines:
         print(f"🤖 Iniciando rutina: {routine_name}")
         return True
 
-    def stop_routine(self):
-        """Detiene la rutina actual."""
+    def stop_routine(self, timeout: float = 0.0):
+        """Detiene la rutina actual.
+        
+        No bloquea por defecto: la rutina sale en su siguiente comprobación o pausa.
+        Con timeout > 0 espera hasta ese tiempo a que el thread termine.
+        """
         self.is_running = False
-        if self.routine_thread and self.routine_thread.is_alive():
-            self.routine_thread.join(timeout=5)
+        self.cancel_event.set()
+        if timeout > 0 and self.routine_thread and self.routine_thread.is_alive():
+            self.routine_thread.join(timeout=timeout)
         self.current_routine = None
         print("🛑 Rutina detenida")
 
@@ -59,45 +78,38 @@ class RobotRoutines:
         """Rutina para que el robot haga un cuadrado."""
         print("🔲 Ejecutando rutina: Cuadrado")
         
-        # Ir a posición inicial
-        self.robot_actions.move_to_position(0, 0, 20, speed)
-        
-        # Dibujar cuadrado
+        # Posición inicial y esquinas del cuadrado
         positions = [
+            (0, 0, 20),
             (size, 0, 20),
             (size, size, 20),
             (0, size, 20),
             (0, 0, 20)
         ]
         
-        for x, y, z in positions:
-            if not self.is_running:
-                break
-            self.robot_actions.move_to_position(x, y, z, speed)
-            time.sleep(1)
-        
-        print("✅ Rutina cuadrado completada")
+        # Enviar el recorrido en bloques de trayectoria; stop_routine lo detiene entre bloques
+        if self.robot_actions.move_through(positions, speed, self.cancel_event):
+            print("✅ Rutina cuadrado completada")
+        elif self.cancel_event.is_set():
+            print("🛑 Rutina cuadrado interrumpida")
+        else:
+            print("❌ Error en rutina cuadrado")
 
     def circle_routine(self, radius: float = 30.0, speed: int = 50, steps: int = 16):
         """Rutina para que el robot haga un círculo."""
         print("⭕ Ejecutando rutina: Círculo")
         
-        import math
-        
-        # Ir a posición inicial
-        self.robot_actions.move_to_position(radius, 0, 20, speed)
-        
-        # Dibujar círculo
-        for i in range(steps + 1):
-            if not self.is_running:
-                break
-            angle = 2 * math.pi * i / steps
-            x = radius * math.cos(angle)
-            y = radius * math.sin(angle)
-            self.robot_actions.move_to_position(x, y, 20, speed)
-            time.sleep(0.5)
+        # Calcular todos los puntos del círculo de una vez; el primero (radius, 0) es la posición inicial
+        angles = np.linspace(0, 2 * np.pi, steps + 1)
+        points = np.column_stack((radius * np.cos(angles), radius * np.sin(angles), np.full(steps + 1, 20.0)))
         
-        print("✅ Rutina círculo completada")
+        # Dibujar el círculo en bloques de trayectoria; stop_routine lo detiene entre bloques
+        if self.robot_actions.move_through(points, speed, self.cancel_event):
+            print("✅ Rutina círculo completada")
+        elif self.cancel_event.is_set():
+            print("🛑 Rutina círculo interrumpida")
+        else:
+            print("❌ Error en rutina círculo")
 
     def pick_and_place_routine(self, pick_x: float, pick_y: float, place_x: float, place_y: float):
         """Rutina automática de recogida y colocación."""
@@ -135,9 +147,8 @@ class RobotRoutines:
             print("❌ No se encontraron objetos que coincidan con los criterios")
             return
         
-        # Ordenar por confianza
-        target_objects.sort(key=lambda x: x.confidence, reverse=True)
-        target = target_objects[0]
+        # Elegir el de mayor confianza (no hace falta ordenar toda la lista)
+        target = max(target_objects, key=lambda obj: obj.confidence)
         
         print(f"🎯 Objetivo seleccionado: {target.id} ({target.color} {target.shape})")
         
@@ -199,7 +210,8 @@ class RobotRoutines:
                 else:
                     print(f"❌ Error clasificando objeto {obj.color}")
                 
-                time.sleep(2)  # Pausa entre objetos
+                if self.cancel_event.wait(2):  # Pausa entre objetos
+                    break
         
         print("✅ Rutina de clasificación completada")
 
@@ -225,7 +237,8 @@ class RobotRoutines:
             self.robot_actions.move_to_position(x, y, z, speed=30)
             
             # Simular inspección
-            time.sleep(3)
+            if self.cancel_event.wait(3):
+                break
             
             # Aquí se podría integrar con el sistema de visión
             if self.vision_system:
@@ -240,7 +253,7 @@ class RobotRoutines:
         
         # Ir a posición home
         self.robot_actions.home_position()
-        time.sleep(2)
+        self.cancel_event.wait(2)
         
         # Verificar límites del workspace
         limits = ROBOT_CONFIG['workspace_limits']
@@ -258,20 +271,26 @@ class RobotRoutines:
                 break
             print(f"🔧 Probando posición: ({x}, {y}, {z})")
             self.robot_actions.move_to_position(x, y, z, speed=20)
-            time.sleep(1)
+            if self.cancel_event.wait(1):
+                break
         
         # Volver a home
         self.robot_actions.home_position()
         
         print("✅ Rutina de calibración completada")
 
-    def get_routine_status(self) -> Dict:
-        """Obtiene el estado de las rutinas."""
-        return {
+    def get_routine_status(self, include_position: bool = True) -> Dict:
+        """Obtiene el estado de las rutinas.
+        
+        Con include_position=False no se consulta la posición al ESP32.
+        """
+        status = {
             'is_running': self.is_running,
-            'current_routine': self.current_routine,
-            'robot_position': self.robot_actions.get_current_position()
+            'current_routine': self.current_routine
         }
+        if include_position:
+            status['robot_position'] = self.robot_actions.get_current_position()
+        return status
 
     def emergency_stop(self):
         """Parada de emergencia."""
@@ -1,9 +1,12 @@
 import serial
-import time
 import threading
-from typing import Optional, Callable
+import queue
+from typing import Optional, Callable, Sequence, Union
 from config import SERIAL_CONFIG, ESP32_COMMANDS
 
+# Comandos sin parámetros ya codificados con su fin de línea (H, E, T...)
+_COMMAND_BYTES = {command: f"{command}\n".encode('utf-8') for command in ESP32_COMMANDS.values()}
+
 class SerialConnection:
     def __init__(self, port: str = None, baud_rate: int = None, timeout: int = None):
         """Inicializa la conexión serial con el ESP32."""
@@ -13,8 +16,24 @@ class SerialConnection:
         self.connection: Optional[serial.Serial] = None
         self.is_connected = False
         self.response_callback: Optional[Callable] = None
+        self.log_traffic = SERIAL_CONFIG['log_traffic']
         self.read_thread: Optional[threading.Thread] = None
         self.stop_reading = False
+        
+        # Serializa comando y respuesta entre los threads que usan la conexión
+        self.command_lock = threading.Lock()
+        # Protege solo la escritura al puerto: el paro (bypass_lock) no se mezcla con un W largo
+        self.write_lock = threading.Lock()
+        
+        # Respuestas a comandos; el thread de lectura es el único que lee el puerto
+        self.responses = queue.Queue()
+        
+        # Se activa cuando el ESP32 informa que terminó el movimiento (DONE)
+        self.motion_done = threading.Event()
+        self.motion_done.set()
+        # True desde que se envía un movimiento hasta que llega su respuesta: un DONE
+        # recibido antes es de un movimiento anterior y no debe activar motion_done
+        self._awaiting_motion_reply = False
 
     def open(self) -> bool:
         """Abre la conexión serial."""
@@ -23,6 +42,7 @@ class SerialConnection:
                 port=self.port,
                 baudrate=self.baud_rate,
                 timeout=self.timeout,
+                write_timeout=SERIAL_CONFIG['write_timeout'],
                 bytesize=serial.EIGHTBITS,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE
@@ -30,6 +50,13 @@ class SerialConnection:
             self.is_connected = True
             print(f"✅ Conexión establecida en {self.port} a {self.baud_rate} baudios")
             
+            # En Linux, pedir al driver que entregue cada byte sin esperar a llenar su buffer
+            if hasattr(self.connection, 'set_low_latency_mode'):
+                try:
+                    self.connection.set_low_latency_mode(True)
+                except (IOError, OSError, ValueError):
+                    pass  # El driver USB-serial no lo soporta
+            
             # Iniciar thread de lectura
             self.start_reading_thread()
             return True
@@ -50,42 +77,66 @@ class SerialConnection:
             self.is_connected = False
             print("🔌 Conexión cerrada.")
 
-    def send_command(self, command: str, wait_response: bool = True, timeout: float = 2.0) -> Optional[str]:
-        """Envía un comando al ESP32 y espera respuesta."""
+    def send_command(self, command: str, wait_response: bool = True, timeout: float = 2.0,
+                     bypass_lock: bool = False, starts_motion: bool = False) -> Optional[str]:
+        """Envía un comando al ESP32 y espera respuesta.
+        
+        Con bypass_lock el comando se escribe sin esperar al que esté en curso
+        (solo para la parada de emergencia, que no espera respuesta).
+        Con starts_motion se desactiva motion_done para el movimiento que inicia el comando.
+        """
         if not self.is_connected or not self.connection:
             print("❌ Error: La conexión no está abierta.")
             return None
 
         try:
-            # Formato del comando: COMANDO:VALOR\n
-            formatted_command = f"{command}\n"
-            self.connection.write(formatted_command.encode('utf-8'))
-            self.connection.flush()
-            print(f"📤 Comando enviado: {command}")
+            if bypass_lock:
+                self._write_command(command)
+                return None
+            
+            with self.command_lock:
+                # Descartar respuestas atrasadas de comandos que ya expiraron
+                self._discard_responses()
+                if starts_motion:
+                    self._awaiting_motion_reply = True
+                    self.motion_done.clear()
+                self._write_command(command)
 
-            if wait_response:
-                return self.wait_response(timeout)
-            return None
+                if wait_response:
+                    return self.wait_response(timeout)
+                return None
 
         except Exception as e:
             print(f"❌ Error al enviar comando: {e}")
             return None
 
+    def _write_command(self, command: str):
+        """Escribe un comando en el puerto serial."""
+        # Formato del comando: COMANDO:VALOR\n (los comandos fijos ya vienen codificados)
+        data = _COMMAND_BYTES.get(command) or f"{command}\n".encode('utf-8')
+        # Sin flush(): no hace falta esperar a que salga el último byte, la respuesta llega después
+        with self.write_lock:
+            self.connection.write(data)
+        if self.log_traffic:
+            print(f"📤 Comando enviado: {command}")
+
     def wait_response(self, timeout: float = 2.0) -> Optional[str]:
         """Espera y lee la respuesta del ESP32."""
-        start_time = time.time()
-        response = ""
-        
-        while time.time() - start_time < timeout:
-            if self.connection.in_waiting:
-                line = self.connection.readline().decode('utf-8').strip()
-                if line:
-                    response = line
-                    print(f"📥 Respuesta recibida: {response}")
-                    break
-            time.sleep(0.01)
-        
-        return response if response else None
+        try:
+            response = self.responses.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if self.log_traffic:
+            print(f"📥 Respuesta recibida: {response}")
+        return response
+
+    def _discard_responses(self):
+        """Vacía la cola de respuestas pendientes."""
+        try:
+            while True:
+                self.responses.get_nowait()
+        except queue.Empty:
+            pass
 
     def start_reading_thread(self):
         """Inicia el thread de lectura continua."""
@@ -93,20 +144,56 @@ class SerialConnection:
         self.read_thread.start()
 
     def _read_loop(self):
-        """Loop de lectura continua de datos del ESP32."""
+        """Loop de lectura continua de datos del ESP32.
+        
+        read() espera en el puerto hasta que llega al menos un byte o vence el timeout,
+        y en la misma llamada toma todo lo que ya estaba en el buffer del driver. Las
+        líneas completas se despachan con _dispatch_line().
+        """
+        buffer = bytearray()
         while not self.stop_reading and self.is_connected:
             try:
-                if self.connection and self.connection.in_waiting:
-                    line = self.connection.readline().decode('utf-8').strip()
+                chunk = self.connection.read(max(1, self.connection.in_waiting))
+                if not chunk:
+                    continue
+                buffer += chunk
+                
+                newline = buffer.find(b'\n')
+                while newline >= 0:
+                    line = buffer[:newline].decode('utf-8', errors='replace').strip()
+                    del buffer[:newline + 1]
                     if line:
-                        print(f"📥 Datos recibidos: {line}")
-                        if self.response_callback:
-                            self.response_callback(line)
-                time.sleep(0.01)
+                        self._dispatch_line(line)
+                    newline = buffer.find(b'\n')
             except Exception as e:
-                print(f"❌ Error en lectura: {e}")
+                if not self.stop_reading:
+                    print(f"❌ Error en lectura: {e}")
                 break
 
+    def _dispatch_line(self, line: str):
+        """Procesa los avisos y entrega el resto de líneas a wait_response()."""
+        if self._handle_notification(line):
+            if self.log_traffic:
+                print(f"📥 Datos recibidos: {line}")
+        else:
+            # Las líneas llegan en orden: a partir de la respuesta al comando, DONE es del
+            # movimiento nuevo (el STATUS periódico del ESP32 no es una respuesta)
+            if not line.startswith("STATUS:"):
+                self._awaiting_motion_reply = False
+            self.responses.put(line)
+        if self.response_callback:
+            self.response_callback(line)
+
+    def _handle_notification(self, line: str) -> bool:
+        """Procesa los avisos asíncronos del ESP32. Retorna True si la línea era un aviso."""
+        if line == "DONE":
+            if not self._awaiting_motion_reply:
+                self.motion_done.set()
+            return True
+        if line == "EMERGENCY_STOP":
+            self.motion_done.set()
+        return False
+
     def set_response_callback(self, callback: Callable):
         """Establece una función callback para manejar respuestas."""
         self.response_callback = callback
@@ -114,7 +201,26 @@ class SerialConnection:
     def move_to_position(self, x: float, y: float, z: float, speed: int = 50) -> bool:
         """Mueve el brazo a una posición específica."""
         command = f"{ESP32_COMMANDS['MOVE_X']}:{x:.2f},{y:.2f},{z:.2f},{speed}"
-        response = self.send_command(command)
+        response = self.send_command(command, starts_motion=True)
+        return response and "OK" in response
+
+    def send_trajectory(self, steps: Sequence[Union[Sequence[float], int]], speed: int = 50,
+                        timeout: float = 30.0) -> bool:
+        """Envía una trayectoria completa en un solo comando.
+        
+        Cada paso es una tupla (x, y, z) o un entero con la posición de la pinza.
+        El ESP32 ejecuta los pasos en orden y responde un único OK al terminar, así que
+        timeout debe cubrir todo el recorrido (RobotActions lo calcula a partir de él).
+        """
+        segments = []
+        for step in steps:
+            if isinstance(step, int):
+                segments.append(f"G{step}")
+            else:
+                x, y, z = step
+                segments.append(f"{x:.2f},{y:.2f},{z:.2f},{speed}")
+        command = f"{ESP32_COMMANDS['TRAJECTORY']}:{';'.join(segments)}"
+        response = self.send_command(command, timeout=timeout, starts_motion=True)
         return response and "OK" in response
 
     def set_speed(self, speed: int) -> bool:
@@ -133,7 +239,7 @@ class SerialConnection:
     def emergency_stop(self) -> bool:
         """Ejecuta parada de emergencia."""
         command = ESP32_COMMANDS['EMERGENCY_STOP']
-        response = self.send_command(command, wait_response=False)
+        self.send_command(command, wait_response=False, bypass_lock=True)
         return True
 
     def get_status(self) -> Optional[dict]:
@@ -1,11 +1,216 @@
 import cv2
+import heapq
+import math
 import numpy as np
 import threading
 import time
+from functools import lru_cache
+from itertools import islice
 from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from config import CAMERA_CONFIG, COLOR_RANGES, DETECTION_CONFIG
 
+def _build_channel_luts() -> Tuple[Dict[str, int], Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Construye una tabla por canal H/S/V con la máscara de bits de los rangos que aceptan cada valor.
+    
+    Cada rango de COLOR_RANGES ocupa un bit; los rangos con "alias" (p. ej. red2, que cierra
+    el giro del tono en 180) se suman a los bits del color al que pertenecen.
+    """
+    if len(COLOR_RANGES) > 8:
+        raise ValueError("COLOR_RANGES admite como máximo 8 rangos en la tabla de etiquetas")
+    
+    color_bits = {}
+    luts = tuple(np.zeros(256, dtype=np.uint8) for _ in range(3))
+    for index, (range_name, color_config) in enumerate(COLOR_RANGES.items()):
+        bit = 1 << index
+        color_name = color_config.get("alias", range_name)
+        color_bits[color_name] = color_bits.get(color_name, 0) | bit
+        for lut, low, high in zip(luts, color_config["lower"], color_config["upper"]):
+            lut[low:high + 1] |= bit
+    return color_bits, luts
+
+# Bits de cada color y tablas H/S/V para etiquetar todos los colores en una pasada
+_COLOR_BITS, _HSV_LUTS = _build_channel_luts()
+
+# Kernel de las operaciones morfológicas (se construye una sola vez).
+# Rectangular: OpenCV lo aplica como dos pasadas separables 1-D (fila y columna)
+_MORPH_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
+# Conversión píxel -> coordenadas del brazo (mm) por cámara: [X, Y, Z] = matriz · [x, y, 1]
+# Estos valores deberían calibrarse para cada cámara
+_PIXEL_TO_WORLD = {
+    # La cámara X no ve el eje Y; factor de escala 0.5 mm/píxel alrededor de x = 320
+    'camera_x': np.array([[0.5, 0.0, -160.0],
+                          [0.0, 0.0, 0.0],
+                          [0.0, 0.0, 0.0]]),
+    # La cámara Y no ve el eje X; factor de escala 0.5 mm/píxel alrededor de y = 240
+    'camera_y': np.array([[0.0, 0.0, 0.0],
+                          [0.0, 0.5, -120.0],
+                          [0.0, 0.0, 0.0]]),
+}
+
+# Formas que se deciden solo por el número de lados del polígono aproximado
+_SHAPES_BY_SIDES = {3: "Triangulo", 5: "Pentagono", 6: "Hexagono", 8: "Octagono"}
+
+# Pool compartido para procesar las máscaras de cada color en paralelo
+_MASK_POOL = ThreadPoolExecutor(max_workers=DETECTION_CONFIG['mask_workers'],
+                                thread_name_prefix="vision-mask")
+
+def _enable_cuda() -> bool:
+    """Indica si la etapa de etiquetado puede ejecutarse con el módulo cv2.cuda."""
+    if not DETECTION_CONFIG['use_cuda']:
+        return False
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+def _enable_opencl() -> bool:
+    """Activa la T-API de OpenCV (OpenCL) si está configurada y disponible."""
+    if not DETECTION_CONFIG['use_opencl']:
+        return False
+    try:
+        if not cv2.ocl.haveOpenCL():
+            return False
+        cv2.ocl.setUseOpenCL(True)
+        return cv2.ocl.useOpenCL()
+    except (AttributeError, cv2.error):
+        return False
+
+# Backend de la etapa de conversión HSV y etiquetado: CUDA, OpenCL (UMat) o CPU.
+# Se elige al crear el primer VisionSystem: importar el módulo no cambia el estado global de OpenCV
+_USE_CUDA = False
+_USE_OPENCL = False
+_backend_selected = False
+
+def _select_backend():
+    """Elige una sola vez el backend de etiquetado según la configuración y el hardware."""
+    global _USE_CUDA, _USE_OPENCL, _backend_selected
+    if _backend_selected:
+        return
+    _USE_CUDA = _enable_cuda()
+    _USE_OPENCL = not _USE_CUDA and _enable_opencl()
+    _backend_selected = True
+
+# Estado CUDA por thread (GpuMat de entrada y tablas de búsqueda en la GPU)
+_cuda_state = threading.local()
+
+def _label_frame_cuda(frame: np.ndarray, scale: float) -> np.ndarray:
+    """Etiqueta los colores del frame en la GPU y descarga solo la imagen de etiquetas."""
+    if not hasattr(_cuda_state, 'frame'):
+        _cuda_state.frame = cv2.cuda_GpuMat()
+        _cuda_state.luts = [cv2.cuda.createLookUpTable(lut.reshape(1, 256)) for lut in _HSV_LUTS]
+    
+    gpu_frame = _cuda_state.frame
+    gpu_frame.upload(frame)
+    if scale != 1.0:
+        height, width = frame.shape[:2]
+        size = (int(round(width * scale)), int(round(height * scale)))
+        gpu_frame = cv2.cuda.resize(gpu_frame, size, interpolation=cv2.INTER_AREA)
+    hsv = cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGR2HSV)
+    
+    h, s, v = cv2.cuda.split(hsv)
+    h_lut, s_lut, v_lut = _cuda_state.luts
+    labels = cv2.cuda.bitwise_and(h_lut.transform(h), s_lut.transform(s))
+    labels = cv2.cuda.bitwise_and(labels, v_lut.transform(v))
+    return labels.download()
+
+def _label_frame_opencl(frame: np.ndarray, scale: float) -> np.ndarray:
+    """Etiqueta los colores del frame sobre UMat (OpenCL) y descarga la imagen de etiquetas."""
+    source = cv2.UMat(frame)
+    if scale != 1.0:
+        source = cv2.resize(source, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(source, cv2.COLOR_BGR2HSV)
+    
+    h, s, v = cv2.split(hsv)
+    h_lut, s_lut, v_lut = _HSV_LUTS
+    labels = cv2.LUT(h, h_lut)
+    cv2.bitwise_and(labels, cv2.LUT(s, s_lut), dst=labels)
+    cv2.bitwise_and(labels, cv2.LUT(v, v_lut), dst=labels)
+    return labels.get()  # Las máscaras por color se procesan en la CPU
+
+# Buffers de reducción, HSV y etiquetas reutilizados por cada thread de detección
+_label_buffers = threading.local()
+
+def _get_label_buffers(size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Obtiene los buffers de etiquetado del thread actual para el tamaño (ancho, alto) dado."""
+    width, height = size
+    buffers = getattr(_label_buffers, 'set', None)
+    if buffers is None or buffers[2].shape != (height, width):
+        buffers = (np.empty((height, width, 3), dtype=np.uint8), np.empty((height, width, 3), dtype=np.uint8),
+                   np.empty((height, width), dtype=np.uint8), np.empty((height, width), dtype=np.uint8))
+        _label_buffers.set = buffers
+    return buffers
+
+def _label_frame(frame: np.ndarray, scale: float) -> np.ndarray:
+    """Etiqueta cada píxel con los bits de los colores cuyo rango lo contiene.
+    
+    El frame se reduce según scale antes de convertirlo a HSV. En la CPU el resultado
+    es un buffer del thread que llama: es válido hasta que ese thread etiquete otro frame.
+    """
+    if _USE_CUDA:
+        return _label_frame_cuda(frame, scale)
+    if _USE_OPENCL:
+        return _label_frame_opencl(frame, scale)
+    
+    height, width = frame.shape[:2]
+    size = (int(round(width * scale)), int(round(height * scale)))
+    small, hsv, labels, tmp = _get_label_buffers(size)
+    source = frame
+    if scale != 1.0:
+        source = cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+    cv2.cvtColor(source, cv2.COLOR_BGR2HSV, dst=hsv)
+    
+    h, s, v = cv2.split(hsv)
+    h_lut, s_lut, v_lut = _HSV_LUTS
+    cv2.LUT(h, h_lut, dst=labels)
+    cv2.bitwise_and(labels, cv2.LUT(s, s_lut, dst=tmp), dst=labels)
+    cv2.bitwise_and(labels, cv2.LUT(v, v_lut, dst=tmp), dst=labels)
+    return labels
+
+# Buffers de máscara reutilizados por cada thread del pool
+_mask_buffers = threading.local()
+
+def _get_mask_buffers(shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Obtiene el par de buffers de máscara del thread actual para el tamaño dado."""
+    buffers = getattr(_mask_buffers, 'pair', None)
+    if buffers is None or buffers[0].shape != shape:
+        buffers = (np.empty(shape, dtype=np.uint8), np.empty(shape, dtype=np.uint8))
+        _mask_buffers.pair = buffers
+    return buffers
+
+@lru_cache(maxsize=256)
+def _text_sprite(text: str, font_scale: float, thickness: int) -> Tuple[np.ndarray, int]:
+    """Renderiza una vez la máscara de un texto; retorna (máscara, altura sobre la línea base)."""
+    (width, height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+    sprite = np.zeros((height + baseline + thickness, width + thickness), dtype=np.uint8)
+    cv2.putText(sprite, text, (0, height), cv2.FONT_HERSHEY_SIMPLEX, font_scale, 255, thickness)
+    return sprite.astype(bool), height
+
+def _put_cached_text(frame: np.ndarray, text: str, org: Tuple[int, int], font_scale: float,
+                     color: Tuple[int, int, int], thickness: int):
+    """Equivalente a cv2.putText para textos repetidos, copiando una máscara ya renderizada."""
+    mask, height = _text_sprite(text, font_scale, thickness)
+    x, top = org[0], org[1] - height
+    rows, cols = mask.shape
+    if x < 0 or top < 0 or top + rows > frame.shape[0] or x + cols > frame.shape[1]:
+        # El texto no cabe completo: dejar que OpenCV lo recorte
+        cv2.putText(frame, text, org, cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+        return
+    frame[top:top + rows, x:x + cols][mask] = color
+
+def _evict_shape_cache(shape_cache: dict, frame_id: int):
+    """Elimina las formas caducadas; si aún sobra espacio ocupado, descarta las más antiguas."""
+    ttl = DETECTION_CONFIG['shape_cache_ttl']
+    for key in [key for key, (_, seen) in shape_cache.items() if frame_id - seen >= ttl]:
+        del shape_cache[key]
+    # Los dict conservan el orden de inserción: las primeras claves son las más antiguas
+    excess = len(shape_cache) - DETECTION_CONFIG['shape_cache_size']
+    if excess > 0:
+        for key in list(islice(shape_cache, excess)):
+            del shape_cache[key]
+
 @dataclass
 class DetectedObject:
     """Clase para representar un objeto detectado."""
@@ -21,15 +226,24 @@ class DetectedObject:
 class VisionSystem:
     def __init__(self):
         """Inicializa el sistema de visión artificial con múltiples cámaras."""
+        _select_backend()
         self.cameras = {}
         self.detected_objects = {}
         self.is_running = False
         self.calibration_matrix = None
         self.camera_threads = {}
+        self.capture_threads = {}
         self.current_frames = {}
+        self.annotated_frames = {} # Último frame con detecciones dibujadas por cámara
         self.frame_locks = {}
+        self.frame_events = {}     # Señalan que hay un frame nuevo por cámara
+        self.frame_requests = {}   # Señalan que la detección espera un frame para decodificar
         self.cameras_initialized = {}
         
+        # Caché de formas por cámara: clave del contorno -> (forma, frame en que se calculó)
+        self.shape_cache = {}
+        self.frame_counters = {}
+        
         # Variables de calibración
         self.camera_height = None  # Altura de la cámara en cm
         self.pixels_per_cm = {}    # Factor de conversión píxeles/cm por cámara
@@ -44,12 +258,26 @@ class VisionSystem:
             try:
                 cap = cv2.VideoCapture(camera_config['index'])
                 if cap.isOpened():
+                    # Códec antes de la resolución: V4L2 negocia el tamaño según el formato
+                    if camera_config.get('fourcc'):
+                        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*camera_config['fourcc']))
+                        # Si el driver rechaza el códec, conserva su formato por defecto
+                        code = int(cap.get(cv2.CAP_PROP_FOURCC))
+                        active = "".join(chr((code >> 8 * i) & 0xFF) for i in range(4))
+                        if active != camera_config['fourcc']:
+                            print(f"⚠️ {camera_name} no acepta {camera_config['fourcc']}; usando formato '{active}'")
                     cap.set(cv2.CAP_PROP_FRAME_WIDTH, camera_config['resolution'][0])
                     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, camera_config['resolution'][1])
                     cap.set(cv2.CAP_PROP_FPS, camera_config['fps'])
+                    # Buffer mínimo del driver para no leer frames atrasados
+                    cap.set(cv2.CAP_PROP_BUFFERSIZE, camera_config.get('buffer_size', 1))
                     self.cameras[camera_name] = cap
                     self.current_frames[camera_name] = None
+                    self.annotated_frames[camera_name] = None
                     self.frame_locks[camera_name] = threading.Lock()
+                    self.frame_events[camera_name] = threading.Event()
+                    self.frame_requests[camera_name] = threading.Event()
+                    self.frame_requests[camera_name].set()
                     self.cameras_initialized[camera_name] = True
                     print(f"✅ {camera_name} inicializada correctamente (índice {camera_config['index']})")
                 else:
@@ -73,8 +301,16 @@ class VisionSystem:
             
         self.is_running = True
         
-        # Iniciar threads para cada cámara disponible
+        # Iniciar threads de captura y detección para cada cámara disponible
         for camera_name in available_cameras:
+            capture_thread = threading.Thread(
+                target=self._capture_loop,
+                args=(camera_name,),
+                daemon=True
+            )
+            self.capture_threads[camera_name] = capture_thread
+            capture_thread.start()
+            
             thread = threading.Thread(
                 target=self._detection_loop,
                 args=(camera_name,),
@@ -91,9 +327,15 @@ class VisionSystem:
         """Detiene la detección continua."""
         self.is_running = False
         
+        # Despertar a los threads de detección que esperan un frame
+        for event in self.frame_events.values():
+            event.set()
+            
         # Esperar a que terminen todos los threads
         for thread in self.camera_threads.values():
             thread.join(timeout=2)
+        for thread in self.capture_threads.values():
+            thread.join(timeout=2)
             
         # Liberar todas las cámaras
         for cap in self.cameras.values():
@@ -102,18 +344,57 @@ class VisionSystem:
             
         print("🛑 Sistema de visión detenido")
 
-    def _detection_loop(self, camera_name: str):
-        """Loop de detección para una cámara específica."""
+    def _capture_loop(self, camera_name: str):
+        """Loop de captura que mantiene solo el frame más reciente de una cámara."""
         cap = self.cameras[camera_name]
+        frame_event = self.frame_events[camera_name]
+        frame_request = self.frame_requests[camera_name]
+        preview_interval = DETECTION_CONFIG['preview_interval']
+        last_decode = 0.0
         
         while self.is_running:
-            ret, frame = cap.read()
+            # grab() vacía el buffer del driver a la tasa de la cámara; retrieve() decodifica
+            if not cap.grab():
+                continue
+            # Decodificar cuando la detección terminó el frame anterior o cuando la
+            # vista previa lleva demasiado sin un frame nuevo (si la detección va lenta)
+            requested = frame_request.is_set()
+            now = time.monotonic()
+            if not requested and now - last_decode < preview_interval:
+                continue
+            if requested:
+                frame_request.clear()
+            ret, frame = cap.retrieve()
             if not ret:
+                if requested:
+                    frame_request.set()
                 continue
+            last_decode = now
                 
-            # Guardar frame actual para esta cámara
+            # Publicar el frame; retrieve() entrega un array nuevo, no hace falta copiarlo
             with self.frame_locks[camera_name]:
-                self.current_frames[camera_name] = frame.copy()
+                self.current_frames[camera_name] = frame
+            # Avisar a la detección solo si lo estaba esperando
+            if requested:
+                frame_event.set()
+
+    def _detection_loop(self, camera_name: str):
+        """Loop de detección para una cámara específica."""
+        frame_event = self.frame_events[camera_name]
+        frame_request = self.frame_requests[camera_name]
+        
+        while self.is_running:
+            # Pedir el siguiente frame y esperar a que la captura lo publique
+            frame_request.set()
+            if not frame_event.wait(timeout=1.0):
+                continue
+            frame_event.clear()
+            
+            # Tomar el frame más reciente (los intermedios se descartan)
+            with self.frame_locks[camera_name]:
+                frame = self.current_frames[camera_name]
+            if frame is None or not self.is_running:
+                continue
                 
             # Detectar objetos en el frame
             objects = self._detect_objects_in_frame(frame, camera_name)
@@ -121,47 +402,54 @@ class VisionSystem:
             # Actualizar objetos detectados para esta cámara
             self.detected_objects[camera_name] = objects
             
-            time.sleep(0.033)  # ~30 FPS
+            # Dibujar las detecciones sobre el mismo frame y publicarlo para la interfaz
+            annotated = self._draw_detections(frame.copy(), camera_name, objects)
+            with self.frame_locks[camera_name]:
+                self.annotated_frames[camera_name] = annotated
 
     def _detect_objects_in_frame(self, frame: np.ndarray, camera_name: str) -> List[DetectedObject]:
         """Detecta objetos en un frame específico."""
         objects = []
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
         
-        for color_name, color_config in COLOR_RANGES.items():
-            # Crear máscara para el color
-            lower = np.array(color_config["lower"])
-            upper = np.array(color_config["upper"])
-            mask = cv2.inRange(hsv, lower, upper)
-            
-            # Operaciones morfológicas para mejorar la detección
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-            
-            # Encontrar contornos
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if area < DETECTION_CONFIG['min_area']:
-                    continue
-                    
-                # Filtrar contornos muy pequeños o muy grandes
-                if area > 50000:  # Área máxima para evitar detecciones falsas
-                    continue
-                    
-                # Detectar forma
-                shape = self._detect_shape(contour)
-                if not shape:
-                    continue
-                    
+        # Procesar las máscaras sobre una copia reducida del frame
+        scale = DETECTION_CONFIG['processing_scale']
+        labels = _label_frame(frame, scale)
+        
+        # Caché de formas de esta cámara (se podan las entradas caducadas si crece demasiado)
+        frame_id = self.frame_counters.get(camera_name, 0) + 1
+        self.frame_counters[camera_name] = frame_id
+        shape_cache = self.shape_cache.setdefault(camera_name, {})
+        if len(shape_cache) > DETECTION_CONFIG['shape_cache_size']:
+            _evict_shape_cache(shape_cache, frame_id)
+        
+        # Factores para devolver las medidas a la resolución original
+        inv_scale = 1.0 / scale
+        area_scale = inv_scale * inv_scale
+        
+        # Máscaras y contornos de cada color en paralelo (OpenCV libera el GIL)
+        results = _MASK_POOL.map(
+            lambda item: (item[0], self._find_color_contours(labels, item[1], area_scale)),
+            _COLOR_BITS.items()
+        )
+        
+        for color_name, contours in results:
+            for contour, contour_area in contours:
+                area = contour_area * area_scale
+                
                 # Calcular centro
                 M = cv2.moments(contour)
-                if M["m00"] != 0:
-                    cx = int(M["m10"] / M["m00"])
-                    cy = int(M["m01"] / M["m00"])
-                else:
+                if M["m00"] == 0:
+                    continue
+                small_cx = M["m10"] / M["m00"]
+                small_cy = M["m01"] / M["m00"]
+                cx = int(small_cx * inv_scale)
+                cy = int(small_cy * inv_scale)
+                
+                # Detectar forma (reutilizando la de contornos que no cambiaron entre frames)
+                perimeter = cv2.arcLength(contour, True)
+                key = (color_name, round(contour_area, -1), round(perimeter), int(small_cx) // 4, int(small_cy) // 4)
+                shape = self._cached_shape(shape_cache, key, frame_id, contour, contour_area, perimeter)
+                if not shape:
                     continue
                     
                 # Calcular confianza basada en el área y forma
@@ -187,42 +475,83 @@ class VisionSystem:
                     
         return objects
 
-    def _detect_shape(self, contour) -> Optional[str]:
+    def _cached_shape(self, shape_cache: dict, key: tuple, frame_id: int, contour, area: float,
+                      perimeter: float) -> Optional[str]:
+        """Obtiene la forma de un contorno desde la caché o la calcula si expiró."""
+        cached = shape_cache.get(key)
+        if cached is not None and frame_id - cached[1] < DETECTION_CONFIG['shape_cache_ttl']:
+            return cached[0]
+        
+        shape = self._detect_shape(contour, area, perimeter)
+        shape_cache[key] = (shape, frame_id)
+        return shape
+
+    def _find_color_contours(self, labels: np.ndarray, color_bits: int, area_scale: float) -> list:
+        """Obtiene los contornos de un color con área válida, como pares (contorno, área escalada)."""
+        mask, tmp = _get_mask_buffers(labels.shape)
+        
+        # Crear máscara para el color (píxeles con alguno de sus bits activo)
+        np.bitwise_and(labels, color_bits, out=mask)
+        
+        # Operaciones morfológicas para mejorar la detección (alternando buffers)
+        cv2.morphologyEx(mask, cv2.MORPH_CLOSE, _MORPH_KERNEL, dst=tmp)
+        cv2.morphologyEx(tmp, cv2.MORPH_OPEN, _MORPH_KERNEL, dst=mask)
+        
+        # Encontrar contornos
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
+        # Filtrar contornos muy pequeños o muy grandes (área máxima para evitar detecciones falsas)
+        # antes del límite, para que los descartados no ocupen plazas de los válidos
+        min_area = DETECTION_CONFIG['min_area'] / area_scale
+        max_area = 50000 / area_scale
+        candidates = []
+        for contour in contours:
+            contour_area = cv2.contourArea(contour)
+            if min_area <= contour_area <= max_area:
+                candidates.append((contour, contour_area))
+        
+        # Si el color cubre mucho la escena, analizar solo los contornos más grandes
+        max_contours = DETECTION_CONFIG['max_contours']
+        if len(candidates) > max_contours:
+            candidates = heapq.nlargest(max_contours, candidates, key=lambda item: item[1])
+        return candidates
+
+    def _detect_shape(self, contour, area: Optional[float] = None,
+                      perimeter: Optional[float] = None) -> Optional[str]:
         """Detecta la forma geométrica del contorno."""
-        epsilon = 0.02 * cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, epsilon, True)
-        sides = len(approx)
+        # Calcular área y perímetro (el perímetro sirve también para approxPolyDP)
+        if area is None:
+            area = cv2.contourArea(contour)
+        if perimeter is None:
+            perimeter = cv2.arcLength(contour, True)
+        if perimeter == 0:
+            return None
         
-        # Calcular área y perímetro
-        area = cv2.contourArea(contour)
-        perimeter = cv2.arcLength(contour, True)
+        # Verificar si es un círculo antes de aproximar el polígono.
+        # circularidad = 4·π·A / P²; se compara sin dividir: 4·π·A > umbral·P²
+        area_term = 4 * math.pi * area
+        perimeter_sq = perimeter * perimeter
+        if area_term > 0.8 * perimeter_sq:
+            return "Circulo"
         
-        # Verificar si es un círculo
-        if perimeter > 0:
-            circularity = 4 * np.pi * area / (perimeter * perimeter)
-            if circularity > 0.8:
-                return "Circulo"
+        approx = cv2.approxPolyDP(contour, 0.02 * perimeter, True)
+        sides = len(approx)
         
         # Detectar formas basadas en el número de lados
-        if sides == 3:
-            return "Triangulo"
+        shape = _SHAPES_BY_SIDES.get(sides)
+        if shape:
+            return shape
         elif sides == 4:
             # Verificar si es un cuadrado o rectángulo
+            # 0.8 <= w/h <= 1.2 en aritmética entera: 4·h <= 5·w <= 6·h
             x, y, w, h = cv2.boundingRect(contour)
-            aspect_ratio = float(w) / h
-            if 0.8 <= aspect_ratio <= 1.2:
+            if 4 * h <= 5 * w <= 6 * h:
                 return "Cuadrado"
             else:
                 return "Rectangulo"
-        elif sides == 5:
-            return "Pentagono"
-        elif sides == 6:
-            return "Hexagono"
-        elif sides == 8:
-            return "Octagono"
         elif sides > 8:
             # Para formas con muchos lados, verificar si es un círculo
-            if circularity > 0.7:
+            if area_term > 0.7 * perimeter_sq:
                 return "Circulo"
             else:
                 return "Poligono"
@@ -263,24 +592,19 @@ class VisionSystem:
 
     def convert_to_world_coordinates(self, pixel_coords: Tuple[int, int], camera_name: str) -> Tuple[float, float, float]:
         """Convierte coordenadas de píxeles a coordenadas del mundo real."""
+        world_x, world_y, world_z = self.convert_to_world_coordinates_batch([pixel_coords], camera_name)[0]
+        return (float(world_x), float(world_y), float(world_z))
+
+    def convert_to_world_coordinates_batch(self, pixel_coords, camera_name: str) -> np.ndarray:
+        """Convierte un lote de coordenadas de píxeles (N, 2) a coordenadas del mundo (N, 3)."""
         # Esta función requeriría calibración de cámara
-        # Por ahora, usamos una conversión simple
-        x, y = pixel_coords
-        
-        # Convertir a coordenadas del brazo (mm)
-        # Estos valores deberían calibrarse para cada cámara
-        if camera_name == "camera_x":
-            world_x = (x - 320) * 0.5  # Factor de escala
-            world_y = 0  # La cámara X no ve el eje Y
-            world_z = 0  # Altura fija
-        elif camera_name == "camera_y":
-            world_x = 0  # La cámara Y no ve el eje X
-            world_y = (y - 240) * 0.5  # Factor de escala
-            world_z = 0  # Altura fija
-        else:
-            world_x = world_y = world_z = 0
-            
-        return (world_x, world_y, world_z)
+        # Por ahora, usamos una conversión lineal por cámara (_PIXEL_TO_WORLD)
+        points = np.asarray(pixel_coords, dtype=np.float64).reshape(-1, 2)
+        matrix = _PIXEL_TO_WORLD.get(camera_name)
+        if matrix is None:
+            return np.zeros((len(points), 3))
+        
+        return points @ matrix[:, :2].T + matrix[:, 2]
 
     def calibrate_with_reference(self, reference_length_cm: float, measured_pixels: float):
         """Calibración usando un objeto de referencia de tamaño conocido."""
@@ -333,8 +657,7 @@ class VisionSystem:
                 else:
                     # Mostrar en píxeles
                     label_text = str(x)
-                cv2.putText(frame, label_text, (x + 5, 20), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+                _put_cached_text(frame, label_text, (x + 5, 20), 0.4, (255, 255, 255), 1)
         
         # Dibujar líneas horizontales
         for y in range(0, height, grid_spacing):
@@ -348,8 +671,7 @@ class VisionSystem:
                 else:
                     # Mostrar en píxeles
                     label_text = str(y)
-                cv2.putText(frame, label_text, (5, y - 5), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+                _put_cached_text(frame, label_text, (5, y - 5), 0.4, (255, 255, 255), 1)
         
         # Dibujar ejes principales (más gruesos)
         center_x, center_y = width // 2, height // 2
@@ -357,15 +679,13 @@ class VisionSystem:
         cv2.line(frame, (0, center_y), (width, center_y), (255, 255, 255), 2)   # Eje X
         
         # Etiquetar el centro
-        cv2.putText(frame, "O", (center_x + 5, center_y - 5), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        _put_cached_text(frame, "O", (center_x + 5, center_y - 5), 0.6, (255, 255, 255), 2)
         
         # Agregar información de la cámara
         camera_info = f"Camara: {camera_name}"
         if self.is_calibrated and camera_name in self.pixels_per_cm:
             camera_info += f" | Altura: {self.camera_height}cm | {self.pixels_per_cm[camera_name]:.1f}px/cm"
-        cv2.putText(frame, camera_info, (10, height - 10), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        _put_cached_text(frame, camera_info, (10, height - 10), 0.5, (255, 255, 255), 1)
         
         return frame
 
@@ -387,7 +707,7 @@ class VisionSystem:
 
     def calculate_distance(self, point1: Tuple[int, int], point2: Tuple[int, int]) -> float:
         """Calcula la distancia euclidiana entre dos puntos."""
-        return np.sqrt((point2[0] - point1[0])**2 + (point2[1] - point1[1])**2)
+        return math.hypot(point2[0] - point1[0], point2[1] - point1[1])
 
     def draw_connections_between_squares(self, frame: np.ndarray, objects: List[DetectedObject]) -> np.ndarray:
         """Dibuja líneas entre cuadrados detectados y muestra las distancias."""
@@ -400,75 +720,76 @@ class VisionSystem:
         # Obtener nombre de la cámara del primer objeto
         camera_name = squares[0].camera if squares else None
         
+        # Calcular todas las distancias de una vez (matriz de pares)
+        centers = np.array([square.center for square in squares], dtype=np.float64)
+        diffs = centers[:, None, :] - centers[None, :, :]
+        distances = np.hypot(diffs[..., 0], diffs[..., 1])
+        if self.is_calibrated and camera_name:
+            distances = self.pixels_to_cm(distances, camera_name)
+            unit = "cm"
+        else:
+            unit = "px"
+        
         # Dibujar conexiones entre todos los cuadrados
-        for i in range(len(squares)):
-            for j in range(i + 1, len(squares)):
-                square1 = squares[i]
-                square2 = squares[j]
-                
-                # Calcular distancia
-                if self.is_calibrated and camera_name:
-                    distance = self.calculate_distance_cm(square1.center, square2.center, camera_name)
-                    distance_text = f"{distance:.1f}cm"
-                else:
-                    distance = self.calculate_distance(square1.center, square2.center)
-                    distance_text = f"{distance:.1f}px"
-                
-                # Color de la línea (usar color del primer cuadrado)
-                line_color = COLOR_RANGES[square1.color]["bgr"]
-                
-                # Dibujar línea
-                cv2.line(frame, square1.center, square2.center, line_color, 2)
-                
-                # Calcular punto medio para mostrar la distancia
-                mid_x = (square1.center[0] + square2.center[0]) // 2
-                mid_y = (square1.center[1] + square2.center[1]) // 2
-                
-                # Fondo para el texto
-                text_size = cv2.getTextSize(distance_text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-                text_x = mid_x - text_size[0] // 2
-                text_y = mid_y + text_size[1] // 2
-                
-                # Dibujar rectángulo de fondo
-                cv2.rectangle(frame, 
-                             (text_x - 5, text_y - text_size[1] - 5),
-                             (text_x + text_size[0] + 5, text_y + 5),
-                             (0, 0, 0), -1)
-                
-                # Dibujar texto de distancia
-                cv2.putText(frame, distance_text, 
-                           (text_x, text_y), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 
-                           0.5, (255, 255, 255), 2)
+        rows, cols = np.triu_indices(len(squares), k=1)
+        for i, j, distance in zip(rows.tolist(), cols.tolist(), distances[rows, cols].tolist()):
+            square1 = squares[i]
+            square2 = squares[j]
+            distance_text = f"{distance:.1f}{unit}"
+            
+            # Color de la línea (usar color del primer cuadrado)
+            line_color = COLOR_RANGES[square1.color]["bgr"]
+            
+            # Dibujar línea
+            cv2.line(frame, square1.center, square2.center, line_color, 2)
+            
+            # Calcular punto medio para mostrar la distancia
+            mid_x = (square1.center[0] + square2.center[0]) // 2
+            mid_y = (square1.center[1] + square2.center[1]) // 2
+            
+            # Fondo para el texto
+            text_size = cv2.getTextSize(distance_text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
+            text_x = mid_x - text_size[0] // 2
+            text_y = mid_y + text_size[1] // 2
+            
+            # Dibujar rectángulo de fondo
+            cv2.rectangle(frame, 
+                         (text_x - 5, text_y - text_size[1] - 5),
+                         (text_x + text_size[0] + 5, text_y + 5),
+                         (0, 0, 0), -1)
+            
+            # Dibujar texto de distancia
+            cv2.putText(frame, distance_text, 
+                       (text_x, text_y), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 
+                       0.5, (255, 255, 255), 2)
         
         return frame
 
     def get_frame_with_detections(self, camera_name: str) -> Optional[np.ndarray]:
-        """Obtiene un frame con las detecciones dibujadas."""
+        """Obtiene un frame con las detecciones dibujadas.
+        
+        El frame lo prepara el thread de detección; es compartido y no debe modificarse.
+        """
         if camera_name not in self.cameras_initialized or not self.cameras_initialized[camera_name]:
             return None
             
-        if self.current_frames[camera_name] is None:
-            return None
-            
-        # Usar el frame actual de esta cámara específica
         with self.frame_locks[camera_name]:
-            if self.current_frames[camera_name] is None:
-                return None
-            frame = self.current_frames[camera_name].copy()
-            
+            return self.annotated_frames[camera_name]
+
+    def _draw_detections(self, frame: np.ndarray, camera_name: str, objects: List[DetectedObject]) -> np.ndarray:
+        """Dibuja la rejilla y los objetos detectados sobre el frame."""
         # Dibujar rejilla de coordenadas
         frame = self.draw_coordinate_grid(frame, camera_name)
             
         # Dibujar objetos detectados
-        objects = self.detected_objects.get(camera_name, [])
         for obj in objects:
             # Dibujar caja
             x, y = obj.center
             color_bgr = COLOR_RANGES[obj.color]["bgr"]
             
             # Tamaño de la caja basado en el área
-            size = int(np.sqrt(obj.area) / 2)
+            size = int(math.sqrt(obj.area) / 2)
             cv2.rectangle(frame, 
                          (x - size, y - size), 
                          (x + size, y + size), 
@@ -476,16 +797,10 @@ class VisionSystem:
             
             # Dibujar texto
             text = f"{obj.shape} {obj.color}"
-            cv2.putText(frame, text, 
-                       (x - size, y - size - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 
-                       0.6, color_bgr, 2)
+            _put_cached_text(frame, text, (x - size, y - size - 10), 0.6, color_bgr, 2)
             
             # Dibujar ID
-            cv2.putText(frame, obj.id, 
-                       (x - size, y + size + 20), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 
-                       0.4, (255, 255, 255), 1)
+            _put_cached_text(frame, obj.id, (x - size, y + size + 20), 0.4, (255, 255, 255), 1)
             
             # Dibujar coordenadas del objeto
             if self.is_calibrated and camera_name in self.pixels_per_cm:
@@ -536,6 +851,38 @@ class VisionSystem:
             }
         return status
 
+    def probe_camera(self, camera_name: str) -> Dict:
+        """Prueba una cámara reutilizando su captura si el sistema ya la tiene abierta.
+        
+        Devuelve un diccionario con 'opened', 'readable' y 'resolution' (ancho, alto) o None.
+        """
+        if self.is_running and self.cameras_initialized.get(camera_name, False):
+            # No tocar la captura: el thread de captura es su único lector
+            with self.frame_locks[camera_name]:
+                frame = self.current_frames[camera_name]
+            if frame is not None:
+                height, width = frame.shape[:2]
+                return {'opened': True, 'readable': True, 'resolution': (width, height)}
+            return {'opened': self.cameras[camera_name].isOpened(), 'readable': False, 'resolution': None}
+        
+        return self.probe_camera_index(CAMERA_CONFIG[camera_name]['index'])
+
+    @staticmethod
+    def probe_camera_index(index: int) -> Dict:
+        """Abre una cámara por índice, comprueba que entrega frames y la libera."""
+        cap = cv2.VideoCapture(index)
+        try:
+            if not cap.isOpened():
+                return {'opened': False, 'readable': False, 'resolution': None}
+            # grab() basta para saber si hay frames; no hace falta decodificarlo
+            if not cap.grab():
+                return {'opened': True, 'readable': False, 'resolution': None}
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            return {'opened': True, 'readable': True, 'resolution': (width, height)}
+        finally:
+            cap.release()
+
     def calibrate_cameras(self):
         """Calibra las cámaras usando un patrón de calibración."""
         # Implementar calibración de cámara usando OpenCV